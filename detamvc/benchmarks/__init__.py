@@ -0,0 +1,52 @@
+"""Performance benchmarks of the model layer and of generated apps.
+
+Run them with `detamvc bench`. Results are JSON, so runs can be compared
+with `detamvc bench --compare previous.json`.
+"""
+import importlib
+import platform
+import time
+
+from detamvc import __version__
+
+SUITES = ("codec", "model", "app")
+
+# the metric compared between runs, per kind of result
+METRICS = ("seconds", "p50_ms")
+
+
+def run(suites=SUITES, rows=None) -> dict:
+    """Run the benchmark suites and return their results with run metadata"""
+    results = {}
+    for suite in suites:
+        module = importlib.import_module(f"detamvc.benchmarks.{suite}")
+        results.update(module.run(rows=rows) if rows else module.run())
+    return {
+        "meta": {
+            "detamvc": __version__,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.time(),
+        },
+        "results": results,
+    }
+
+
+def compare(previous: dict, current: dict) -> list:
+    """Compare two runs.
+
+    Returns:
+        list: `(name, metric, before, after, ratio)` for every result present in
+            both runs, where a ratio above 1 means the current run is slower.
+    """
+    rows = []
+    for name, values in current["results"].items():
+        before = previous["results"].get(name)
+        if not before:
+            continue
+        for metric in METRICS:
+            if metric in values and before.get(metric):
+                rows.append(
+                    (name, metric, before[metric], values[metric],
+                     round(values[metric] / before[metric], 3)))
+    return rows
@@ -0,0 +1,111 @@
+"""Request latency of a generated scaffold app under concurrent load.
+
+A throwaway project is generated in a temporary directory, scaffolded with
+an `item` object and served in-process against the local Base stand-in.
+
+Run with `python -m detamvc.benchmarks.app`.
+"""
+import asyncio
+import contextlib
+import importlib
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from detamvc.generator import build_base, gen_scaffold
+
+PROJECT = "benchapp"
+PROJECT_MODULES = ("main", "item", "static_pages")
+
+
+def latency(timings: list) -> dict:
+    timings = sorted(timings)
+    return {
+        "requests": len(timings),
+        "p50_ms": round(statistics.median(timings) * 1000, 3),
+        "p95_ms": round(timings[int(len(timings) * 0.95) - 1] * 1000, 3),
+        "max_ms": round(timings[-1] * 1000, 3),
+    }
+
+
+async def load(client, method: str, paths: list, concurrency: int, data=None) -> list:
+    """Send one request per path, `concurrency` at a time, returning the
+    duration of each"""
+    gate = asyncio.Semaphore(concurrency)
+
+    async def send(path):
+        async with gate:
+            started = time.perf_counter()
+            response = await client.request(method, path, data=data)
+            await response.aread()
+            assert response.status_code < 400, f"{method} {path}: {response.status_code}"
+            return time.perf_counter() - started
+
+    return await asyncio.gather(*(send(path) for path in paths))
+
+
+@contextlib.contextmanager
+def generated_app(tmp: str, use_async: bool = False):
+    """Generate the scaffold project in `tmp` and yield its FastAPI app"""
+    cwd = os.getcwd()
+    project_path = os.path.join(tmp, PROJECT)
+    previous = {k: os.environ.get(k) for k in ("DETAMVC_BACKEND", "DETAMVC_LOCAL_PATH")}
+    os.chdir(tmp)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            build_base(PROJECT, PROJECT, "BOOTSTRAP")
+            os.chdir(PROJECT)
+            gen_scaffold(".", "item", ["name:str", "price:float", "quantity:int"], use_async)
+        os.environ["DETAMVC_BACKEND"] = "local"
+        os.environ["DETAMVC_LOCAL_PATH"] = str(Path(tmp) / "bench.sqlite3")
+        sys.path.insert(0, project_path)
+        yield importlib.import_module("main").app
+    finally:
+        if project_path in sys.path:
+            sys.path.remove(project_path)
+        for name in list(sys.modules):
+            if name.split(".")[0] in PROJECT_MODULES:
+                del sys.modules[name]
+        for k, v in previous.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+        os.chdir(cwd)
+
+
+async def _measure(app, Item, rows: int, requests: int, concurrency: int) -> dict:
+    Item.put_many(
+        [Item(name=f"item {i}", price=i, quantity=i) for i in range(rows)],
+        concurrency=4)
+    keys = [item.key for item in Item.get_all(limit=requests)]
+    async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+        index = await load(client, "GET", ["/item/"] * requests, concurrency)
+        view = await load(
+            client, "GET", [f"/item/{keys[i % len(keys)]}" for i in range(requests)],
+            concurrency)
+        create = await load(
+            client, "POST", ["/item/new"] * requests, concurrency,
+            data={"name": "new", "price": "1.5", "quantity": "3"})
+    return {"index": latency(index), "view": latency(view), "create": latency(create)}
+
+
+def run(rows: int = 500, requests: int = 100, concurrency: int = 10,
+        use_async: bool = False) -> dict:
+    prefix = "app.async" if use_async else "app"
+    with tempfile.TemporaryDirectory() as tmp:
+        with generated_app(tmp, use_async) as app:
+            Item = importlib.import_module("item.model").Item
+            measured = asyncio.run(_measure(app, Item, rows, requests, concurrency))
+    return {f"{prefix}.{route}": values for route, values in measured.items()}
+
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=4))
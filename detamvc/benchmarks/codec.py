@@ -0,0 +1,173 @@
+"""Throughput of the DetaModel codec (`_serialize` / `_deserialize`), with
+and without validation of the decoded values, and speedup over the codec
+that looped over the fields on every call (`legacy_serialize` and
+`legacy_deserialize`).
+
+Run with `python -m detamvc.benchmarks.codec`.
+"""
+import datetime
+import json
+import time
+from typing import List, Optional
+
+import ujson
+from pydantic import BaseModel
+
+from detamvc.model import DETA_TYPES, DetaModel
+
+
+class Dimensions(BaseModel):
+    width: float
+    height: float
+
+
+class BenchItem(DetaModel):
+    name: str
+    description: str
+    price: float
+    quantity: int
+    available: bool
+    tags: List[str]
+    created: datetime.datetime
+    released: datetime.date
+    opens: datetime.time
+    dimensions: Optional[Dimensions]
+
+    class Config:
+        table_name = "detamvc_bench_item"
+
+
+def sample_items(rows: int) -> list:
+    """Build `rows` fully populated `BenchItem` instances."""
+    start = datetime.datetime(2023, 1, 1, 8, 30, 15, 250)
+    return [
+        BenchItem(
+            key=f"{i:012d}",
+            name=f"item {i}",
+            description="lorem ipsum dolor sit amet " * 4,
+            price=i * 1.25,
+            quantity=i,
+            available=bool(i % 2),
+            tags=["a", "b", str(i % 7)],
+            created=start + datetime.timedelta(minutes=i),
+            released=(start + datetime.timedelta(days=i % 365)).date(),
+            opens=(start + datetime.timedelta(seconds=i)).time(),
+            dimensions=Dimensions(width=i, height=i / 2),
+        )
+        for i in range(rows)
+    ]
+
+
+def legacy_serialize(item) -> dict:
+    """`_serialize` as it was before the codec plans"""
+    as_dict = {}
+    for field_name, field in item.__class__.__fields__.items():
+        if field_name == "key" and not item.key:
+            continue
+        value = getattr(item, field_name, None)
+        if value is None:
+            as_dict[field_name] = None
+        elif field.type_ in DETA_TYPES:
+            as_dict[field_name] = value
+        elif field.type_ == datetime.datetime:
+            as_dict[field_name] = value.timestamp()
+        elif field.type_ == datetime.date:
+            as_dict[field_name] = int(value.strftime("%Y%m%d"))
+        elif field.type_ == datetime.time:
+            as_dict[field_name] = int(value.strftime("%H%M%S%f"))
+        else:
+            as_dict[field_name] = ujson.loads(item.json(include={field_name}))[field_name]
+    return as_dict
+
+
+def legacy_decode(cls, data) -> dict:
+    """Conversion step of `_deserialize` as it was before the codec plans"""
+    as_dict = {}
+    for field_name, field in cls.__fields__.items():
+        if field_name not in data:
+            as_dict[field_name] = field.type_()
+        elif field.type_ in DETA_TYPES:
+            as_dict[field_name] = data[field_name]
+        elif field.type_ == datetime.datetime:
+            as_dict[field_name] = datetime.datetime.fromtimestamp(data[field_name])
+        elif field.type_ == datetime.date:
+            as_dict[field_name] = datetime.datetime.strptime(
+                str(data[field_name]), "%Y%m%d").date()
+        elif field.type_ == datetime.time:
+            as_dict[field_name] = datetime.datetime.strptime(
+                str(data[field_name]), "%H%M%S%f").time()
+        else:
+            try:
+                as_dict[field_name] = ujson.loads(data.get(field_name))
+            except (TypeError, ValueError):
+                as_dict[field_name] = data.get(field_name, None)
+    return as_dict
+
+
+def legacy_deserialize(cls, data):
+    return cls.parse_obj(legacy_decode(cls, data))
+
+
+def best_of(fn, repeat: int) -> float:
+    """Return the fastest wall-clock time of `repeat` calls to `fn`."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def result(rows: int, seconds: float) -> dict:
+    return {
+        "rows": rows,
+        "seconds": round(seconds, 6),
+        "rows_per_sec": round(rows / seconds, 1) if seconds else None,
+    }
+
+
+def speedup(legacy: float, current: float) -> Optional[float]:
+    return round(legacy / current, 2) if current else None
+
+
+def run(rows: int = 10_000, repeat: int = 3) -> dict:
+    items = sample_items(rows)
+    records = [item._serialize() for item in items]
+    assert [legacy_serialize(item) for item in items[:100]] == records[:100]
+    encode = best_of(lambda: [item._serialize() for item in items], repeat)
+    decode = best_of(lambda: [BenchItem._decode(record) for record in records], repeat)
+    deserialize = best_of(
+        lambda: [BenchItem._deserialize(record) for record in records], repeat
+    )
+    trusted = best_of(
+        lambda: [BenchItem._deserialize(record, trusted=True) for record in records],
+        repeat
+    )
+    read_row = BenchItem._reader(output="record")
+    as_rows = best_of(lambda: [read_row(record) for record in records], repeat)
+    legacy_encode = best_of(lambda: [legacy_serialize(item) for item in items], repeat)
+    legacy_conversion = best_of(
+        lambda: [legacy_decode(BenchItem, record) for record in records], repeat)
+    legacy_validated = best_of(
+        lambda: [legacy_deserialize(BenchItem, record) for record in records], repeat)
+    return {
+        "codec.encode": result(rows, encode),
+        "codec.decode": result(rows, decode),
+        "codec.decode_and_validate": result(rows, deserialize),
+        "codec.decode_trusted": result(rows, trusted),
+        "codec.decode_record": result(rows, as_rows),
+        "codec.legacy.encode": result(rows, legacy_encode),
+        "codec.legacy.decode": result(rows, legacy_conversion),
+        "codec.legacy.decode_and_validate": result(rows, legacy_validated),
+        # how many times faster than the legacy codec
+        "codec.speedup": {
+            "encode": speedup(legacy_encode, encode),
+            "decode": speedup(legacy_conversion, decode),
+            "decode_and_validate": speedup(legacy_validated, deserialize),
+            "decode_trusted": speedup(legacy_validated, trusted),
+        },
+    }
+
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=4))
@@ -0,0 +1,95 @@
+"""Bytes on the wire and codec time of the field codecs (see
+detamvc/codecs.py), for a model with a long text field and a nested model.
+
+Run with `python -m detamvc.benchmarks.compression`. zstd is skipped when
+the zstandard package is missing.
+"""
+import datetime
+import json
+from typing import List, Optional
+
+import ujson
+from pydantic import BaseModel
+
+from detamvc.benchmarks.codec import best_of
+from detamvc.model import DetaModel
+
+
+class Revision(BaseModel):
+    author: str
+    edited: datetime.datetime
+    changes: List[str]
+
+
+PARAGRAPH = (
+    "<p>Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod "
+    "tempor incididunt ut labore et dolore magna aliqua. Item {i} ships in "
+    "<b>{days} days</b> from the <a href=\"/warehouse/{w}\">warehouse {w}</a>.</p>\n"
+)
+
+
+def page_model(codecs: Optional[dict]) -> type:
+    class Config:
+        table_name = "detamvc_bench_page"
+
+    if codecs:
+        Config.codecs = codecs
+    return type("BenchPage", (DetaModel,), {
+        "__annotations__": {"title": str, "body": str, "revision": Revision},
+        "__module__": __name__,
+        "Config": Config,
+    })
+
+
+def sample_values(rows: int) -> list:
+    edited = datetime.datetime(2023, 1, 1, 8, 30)
+    return [
+        {
+            "key": f"{i:012d}",
+            "title": f"page {i}",
+            "body": "".join(
+                PARAGRAPH.format(i=i, days=n % 9, w=(i + n) % 4) for n in range(12)),
+            "revision": Revision(
+                author=f"user {i % 50}", edited=edited + datetime.timedelta(minutes=i),
+                changes=[f"change {n}" for n in range(5)]),
+        }
+        for i in range(rows)
+    ]
+
+
+def variants() -> dict:
+    found = {
+        "plain": None,
+        "json": {"revision": "json"},
+        "zlib": {"body": "zlib", "revision": "json"},
+    }
+    try:
+        import zstandard  # noqa: F401
+    except ImportError:
+        return found
+    found["zstd"] = {"body": "zstd", "revision": "json"}
+    return found
+
+
+def run(rows: int = 2_000, repeat: int = 3) -> dict:
+    values = sample_values(rows)
+    results = {}
+    for name, codecs in variants().items():
+        model = page_model(codecs)
+        items = [model(**value) for value in values]
+        records = [item._serialize() for item in items]
+        wire = sum(len(ujson.dumps(record).encode()) for record in records)
+        encode = best_of(lambda: [item._serialize() for item in items], repeat)
+        decode = best_of(lambda: [model._decode(record) for record in records], repeat)
+        assert model._deserialize(records[0]) == items[0]
+        results[f"compression.{name}"] = {
+            "rows": rows,
+            "bytes_per_row": round(wire / rows, 1),
+            "encode_seconds": round(encode, 6),
+            "decode_seconds": round(decode, 6),
+        }
+    return results
+
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=4))
@@ -0,0 +1,42 @@
+"""Throughput of `put_many` and `get_all` against the local Base stand-in.
+
+Run with `python -m detamvc.benchmarks.model`.
+"""
+import json
+import os
+import tempfile
+from pathlib import Path
+
+from detamvc.benchmarks.codec import BenchItem, best_of, result, sample_items
+
+
+def run(rows: int = 10_000, repeat: int = 3, concurrency: int = 4) -> dict:
+    items = sample_items(rows)
+    with tempfile.TemporaryDirectory() as tmp:
+        previous = {k: os.environ.get(k) for k in ("DETAMVC_BACKEND", "DETAMVC_LOCAL_PATH")}
+        os.environ["DETAMVC_BACKEND"] = "local"
+        os.environ["DETAMVC_LOCAL_PATH"] = str(Path(tmp) / "bench.sqlite3")
+        BenchItem.reset_clients()
+        try:
+            put_serial = best_of(lambda: BenchItem.put_many(items), repeat)
+            put_concurrent = best_of(
+                lambda: BenchItem.put_many(items, concurrency=concurrency), repeat)
+            get_all = best_of(BenchItem.get_all, repeat)
+            iter_first = best_of(lambda: next(BenchItem.iter_all(page_size=100)), repeat)
+        finally:
+            BenchItem.reset_clients()
+            for k, v in previous.items():
+                if v is None:
+                    os.environ.pop(k, None)
+                else:
+                    os.environ[k] = v
+    return {
+        "model.put_many": result(rows, put_serial),
+        f"model.put_many.concurrency_{concurrency}": result(rows, put_concurrent),
+        "model.get_all": result(rows, get_all),
+        "model.iter_all.first_row": result(1, iter_first),
+    }
+
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=4))
@@ -0,0 +1,335 @@
+"""Read-through caches for DetaModel.
+
+A model opts in through its Config:
+
+    class Item(DetaModel):
+        name: str
+
+        class Config:
+            cache_size = 1000              # entries kept, least recently used go first
+            cache_ttl = 60                 # seconds, None keeps entries until evicted
+            cache_backend = LRUCache       # or SharedMemoryCache, or a CacheBackend
+            query_cache_size = 100         # results of `query`/`get_all`
+            query_cache_ttl = 60           # defaults to cache_ttl
+
+Backends store strings: the model hands them JSON-encoded records, so every
+read builds a fresh object and nothing cached can be mutated from outside.
+
+Reads that miss the cache go through `SingleFlight`: concurrent identical
+reads share one Base request (set `single_flight = False` to turn it off).
+"""
+import asyncio
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+import ujson
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+
+class CacheBackend:
+    """Interface of a cache backend.
+
+    Args:
+        namespace (str): name shared by every entry of one model.
+        size (int): maximum number of entries kept.
+        ttl (float, optional): seconds an entry lives. Defaults to None, no expiry.
+    """
+
+    def __init__(self, namespace: str, size: int, ttl: Optional[float] = None):
+        self.namespace = namespace
+        self.size = size
+        self.ttl = ttl
+        self.stats = CacheStats()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached value, or None on a miss"""
+        raise NotImplementedError
+
+    def set(self, key: str, value: str) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    def generation(self) -> int:
+        """Counter bumped by every write through the model. Query results are
+        cached under the generation they were fetched in, so a write makes
+        every earlier result unreachable; a record fetched while it moved is
+        not kept in the record cache."""
+        raise NotImplementedError
+
+    def bump_generation(self) -> None:
+        raise NotImplementedError
+
+    def _expires(self):
+        return time.time() + self.ttl if self.ttl else None
+
+
+class LRUCache(CacheBackend):
+    """In-process cache, private to one worker"""
+
+    def __init__(self, namespace: str, size: int, ttl: Optional[float] = None):
+        super().__init__(namespace, size, ttl)
+        self._entries = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] is not None and entry[0] < time.time():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.stats.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (self._expires(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+                self.stats.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def generation(self):
+        return self._generation
+
+    def bump_generation(self):
+        with self._lock:
+            self._generation += 1
+
+
+def _shared_cache_path() -> Path:
+    # /dev/shm is memory backed on Linux; fall back to the temp dir elsewhere
+    shm = Path("/dev/shm")
+    directory = shm if shm.is_dir() else Path(tempfile.gettempdir())
+    return directory / "detamvc_cache.sqlite3"
+
+
+class SharedMemoryCache(CacheBackend):
+    """Cache shared by every worker process on the host.
+
+    Entries live in a SQLite database on a memory-backed file system, so
+    several uvicorn workers read each other's entries and invalidations.
+    The hit/miss/eviction counters are kept per process.
+
+    Args:
+        path (str, optional): database file. Defaults to the
+            DETAMVC_CACHE_PATH environment variable, or a file in /dev/shm.
+    """
+
+    def __init__(self, namespace: str, size: int, ttl: Optional[float] = None,
+                 path: Optional[str] = None):
+        super().__init__(namespace, size, ttl)
+        self.path = str(path or os.getenv("DETAMVC_CACHE_PATH") or _shared_cache_path())
+        self._local = threading.local()
+        with self._connection() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "namespace TEXT, key TEXT, value TEXT, expires REAL, used REAL, "
+                "PRIMARY KEY (namespace, key))")
+            db.execute("CREATE INDEX IF NOT EXISTS cache_used ON cache (namespace, used)")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS generations ("
+                "namespace TEXT PRIMARY KEY, value INTEGER)")
+
+    def _connection(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=OFF")
+            self._local.db = db
+        return db
+
+    def get(self, key):
+        db = self._connection()
+        now = time.time()
+        row = db.execute(
+            "SELECT value, expires FROM cache WHERE namespace = ? AND key = ?",
+            (self.namespace, key)).fetchone()
+        if row is None or (row[1] is not None and row[1] < now):
+            self.stats.misses += 1
+            return None
+        db.execute(
+            "UPDATE cache SET used = ? WHERE namespace = ? AND key = ?",
+            (now, self.namespace, key))
+        self.stats.hits += 1
+        return row[0]
+
+    def set(self, key, value):
+        db = self._connection()
+        db.execute(
+            "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?)",
+            (self.namespace, key, value, self._expires(), time.time()))
+        evicted = db.execute(
+            "DELETE FROM cache WHERE namespace = ? AND key IN ("
+            "SELECT key FROM cache WHERE namespace = ? "
+            "ORDER BY used DESC LIMIT -1 OFFSET ?)",
+            (self.namespace, self.namespace, self.size)).rowcount
+        self.stats.evictions += max(evicted, 0)
+
+    def delete(self, key):
+        self._connection().execute(
+            "DELETE FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key))
+
+    def clear(self):
+        self._connection().execute(
+            "DELETE FROM cache WHERE namespace = ?", (self.namespace,))
+
+    def generation(self):
+        row = self._connection().execute(
+            "SELECT value FROM generations WHERE namespace = ?",
+            (self.namespace,)).fetchone()
+        return row[0] if row else 0
+
+    def bump_generation(self):
+        self._connection().execute(
+            "INSERT INTO generations VALUES (?, 1) ON CONFLICT (namespace) "
+            "DO UPDATE SET value = value + 1", (self.namespace,))
+
+
+@dataclass
+class FlightStats:
+    # reads sent to the Base
+    calls: int = 0
+    # reads that waited for an identical one instead
+    coalesced: int = 0
+
+
+class _Flight:
+    __slots__ = ("done", "future", "waiters", "result", "error")
+
+    def __init__(self, future=None):
+        self.done = threading.Event()
+        self.future = future
+        self.waiters = 0
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Runs concurrent calls with the same key once, every caller getting the
+    result. The caller that made the call gets it as is; the ones that joined
+    get their own copy, decoded from one JSON encoding made only when someone
+    joined.
+
+    Flights started before `bump()` are not joined anymore: a write bumps it,
+    so a read after a write never gets what was read before it.
+    """
+
+    def __init__(self):
+        self.stats = FlightStats()
+        self._generation = 0
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def bump(self) -> None:
+        with self._lock:
+            self._generation += 1
+
+    def _join(self, key, future=None):
+        """The flight of `key` and whether the caller leads it. Async leaders
+        are not counted as calls: they wait for a thread that runs `do`."""
+        with self._lock:
+            flight_key = (self._generation, key)
+            flight = self._flights.get(flight_key)
+            if flight is not None:
+                flight.waiters += 1
+                self.stats.coalesced += 1
+                return flight_key, flight, False
+            flight = self._flights[flight_key] = _Flight(future)
+            if future is None:
+                self.stats.calls += 1
+            return flight_key, flight, True
+
+    def _land(self, flight_key, flight, result=None, error=None) -> None:
+        """Close a flight, encoding the result for the callers that joined"""
+        with self._lock:
+            del self._flights[flight_key]
+            waiters = flight.waiters
+        if error is None and waiters:
+            try:
+                flight.result = ujson.dumps(result)
+            except Exception as e:
+                error = e
+        flight.error = error
+
+    def do(self, key, fn):
+        """Call `fn()`, unless another thread is already running it for `key`"""
+        flight_key, flight, leader = self._join(key)
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return ujson.loads(flight.result)
+        try:
+            result = fn()
+        except BaseException as e:
+            self._land(flight_key, flight, error=e)
+            flight.done.set()
+            raise
+        self._land(flight_key, flight, result)
+        flight.done.set()
+        return result
+
+    async def ado(self, key, fn):
+        """Await `fn()`, unless a task of this event loop is already awaiting
+        it for `key`. Waiting tasks hold no thread."""
+        loop = asyncio.get_running_loop()
+        flight_key, flight, leader = self._join((id(loop), key), loop.create_future())
+        if not leader:
+            await asyncio.shield(flight.future)
+            if flight.error is not None:
+                raise flight.error
+            return ujson.loads(flight.result)
+        try:
+            result = await fn()
+        except BaseException as e:
+            self._land(flight_key, flight, error=e)
+            flight.future.set_result(None)
+            raise
+        self._land(flight_key, flight, result)
+        flight.future.set_result(None)
+        return result
+
+
+def normalize_query(query) -> str:
+    """Canonical string of a Deta query: the same for any key order of its
+    conditions, and for any order of the alternatives of an OR query."""
+    if query is None:
+        return "null"
+    if isinstance(query, dict):
+        return ujson.dumps(query, sort_keys=True)
+    alternatives = sorted({ujson.dumps(q, sort_keys=True) for q in query})
+    if len(alternatives) == 1:
+        return alternatives[0]
+    return "[" + ",".join(alternatives) + "]"
@@ -0,0 +1,172 @@
+"""Storage codecs of single fields.
+
+    class Page(DetaModel):
+        title: str
+        body: str
+        layout: Layout
+
+        class Config:
+            codecs = {"body": "zlib", "layout": "json"}
+            compress_min_size = 1024        # bytes of JSON, the default
+
+- "json": nested models, alone or in a list, are converted by an encoder
+  compiled for their fields, reading them directly instead of going through
+  `dict()`, `json()` and `ujson.loads`; other values of other than Deta types
+  by ujson in one pass. The stored data is the same.
+- "zlib", "zstd": the JSON of a value of at least `compress_min_size` bytes
+  is compressed and stored base64-encoded in a tagged envelope,
+  `{"codec": "zlib", "data": "..."}`, unless that is no smaller. Other values
+  are stored as usual. "zstd" needs the zstandard package
+  (`pip install detamvc[zstd]`).
+
+Reads of a field with any codec open envelopes of either compression, so
+setting a codec on a field with stored records, or switching compressions,
+needs no migration; keep a codec on a field once it holds compressed records.
+The Base only sees the envelope of compressed values: don't query or index
+on those fields.
+
+Run `python -m detamvc.benchmarks.compression` for sizes and timings.
+"""
+import base64
+import datetime
+import zlib
+from typing import Callable, Optional, Tuple
+
+import ujson
+from pydantic import BaseModel
+from pydantic.fields import SHAPE_LIST, SHAPE_SET, SHAPE_SINGLETON, SHAPE_TUPLE_ELLIPSIS
+
+CODECS = ("json", "zlib", "zstd")
+COMPRESSIONS = ("zlib", "zstd")
+DEFAULT_COMPRESS_MIN_SIZE = 1024
+
+
+def _zlib():
+    return lambda data: zlib.compress(data, 6), zlib.decompress
+
+
+def _zstd():
+    from detamvc.extras.zstd import compress, decompress
+
+    return compress, decompress
+
+
+_compressions = {"zlib": _zlib, "zstd": _zstd}
+_loaded = {}
+
+
+def compression(name: str) -> Tuple[Callable, Callable]:
+    """`(compress, decompress)` functions of bytes of a compression"""
+    functions = _loaded.get(name)
+    if functions is None:
+        functions = _loaded[name] = _compressions[name]()
+    return functions
+
+
+def is_envelope(value) -> bool:
+    return (
+        isinstance(value, dict) and len(value) == 2
+        and value.get("codec") in COMPRESSIONS and isinstance(value.get("data"), str))
+
+
+def open_envelope(value):
+    """The value stored in an envelope"""
+    decompress = compression(value["codec"])[1]
+    return ujson.loads(decompress(base64.b64decode(value["data"])))
+
+
+JSON_TYPES = (str, int, float, bool)
+ISO_TYPES = (datetime.datetime, datetime.date, datetime.time)
+SEQUENCE_SHAPES = (SHAPE_LIST, SHAPE_SET, SHAPE_TUPLE_ELLIPSIS)
+
+
+def fast_json_encoder(field, default: Callable) -> Optional[Callable]:
+    """Convert the values of a model field, a pydantic `ModelField`, to the
+    JSON data pydantic's `json()` would give, `default` being the model's
+    `__json_encoder__`. None for values stored as they are."""
+    return _field_encoder(field, default)
+
+
+def _generic_encoder(default):
+    def encode(value):
+        return ujson.loads(ujson.dumps(value, default=default, ensure_ascii=False))
+
+    return encode
+
+
+def _compilable(type_) -> bool:
+    return (
+        isinstance(type_, type) and issubclass(type_, BaseModel)
+        and not type_.__config__.json_encoders)
+
+
+def _model_encoder(model, default):
+    # fields are resolved on the first call, so models can nest themselves
+    steps = None
+    generic = _generic_encoder(default)
+
+    def encode(value):
+        nonlocal steps
+        if not isinstance(value, model):
+            # e.g. a dict assigned to the field, which is not validated
+            return generic(value)
+        if steps is None:
+            steps = tuple(
+                (name, _field_encoder(field, default))
+                for name, field in model.__fields__.items())
+        values = value.__dict__
+        data = {}
+        for name, convert in steps:
+            item = values[name]
+            data[name] = item if item is None or convert is None else convert(item)
+        return data
+
+    return encode
+
+
+def _field_encoder(field, default):
+    """Converter of the values of one field, None for values kept as they are"""
+    type_ = field.type_
+    if field.shape == SHAPE_SINGLETON:
+        if type_ in JSON_TYPES:
+            return None
+        if type_ in ISO_TYPES:
+            return type_.isoformat
+        if _compilable(type_):
+            return _model_encoder(type_, default)
+    elif field.shape in SEQUENCE_SHAPES:
+        if type_ in JSON_TYPES:
+            return list
+        if _compilable(type_):
+            encode = _model_encoder(type_, default)
+            return lambda values: [None if v is None else encode(v) for v in values]
+    return _generic_encoder(default)
+
+
+def field_codec(name: str, encode: Optional[Callable], decode: Optional[Callable],
+                min_size: int = DEFAULT_COMPRESS_MIN_SIZE):
+    """Wrap the encoder and decoder of a field, `None` meaning stored as is,
+    in the compression `name`. Returns the new `(encode, decode)`."""
+    compress = compression(name)[0]
+
+    def encode_field(value):
+        data = value if encode is None else encode(value)
+        raw = ujson.dumps(data, ensure_ascii=False).encode()
+        if len(raw) < min_size:
+            return data
+        packed = base64.b64encode(compress(raw)).decode("ascii")
+        if len(packed) >= len(raw):
+            return data
+        return {"codec": name, "data": packed}
+
+    return encode_field, unwrap_decoder(decode)
+
+
+def unwrap_decoder(decode: Optional[Callable]) -> Callable:
+    """Decoder that first opens compressed envelopes"""
+    def decode_field(value):
+        if is_envelope(value):
+            value = open_envelope(value)
+        return value if decode is None else decode(value)
+
+    return decode_field
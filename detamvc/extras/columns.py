@@ -0,0 +1,187 @@
+"""Columnar export of model data for analytics. Needs numpy.
+
+    columns = Item.to_columns({"available": True}, fields=["category", "price"])
+    columns["price"]                          # numpy array
+    columns.mean("price")
+    columns.group_by("category", "price", "sum")
+
+Pages stream from the Base straight into one typed buffer per field, without
+building model objects:
+
+- int, float: int64 / float64. Missing values are NaN, which makes an int
+  column float64.
+- bool: bool, or object when values are missing.
+- datetime: datetime64[us], UTC, from the stored timestamps. Missing are NaT.
+- date: datetime64[D]; time: timedelta64[us] since midnight.
+- anything else, str included: object arrays of the decoded values.
+"""
+import datetime
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from pydantic.fields import SHAPE_SINGLETON
+
+AGGREGATES = ("count", "sum", "mean")
+
+
+def _column_kind(field) -> str:
+    if field.shape != SHAPE_SINGLETON:
+        return "object"
+    type_ = field.type_
+    if type_ is bool:
+        return "bool"
+    if type_ in (int, float):
+        return type_.__name__
+    if type_ is datetime.datetime:
+        return "datetime"
+    if type_ is datetime.date:
+        return "date"
+    if type_ is datetime.time:
+        return "time"
+    return "object"
+
+
+def _numbers(values: list, dtype) -> np.ndarray:
+    if None in values:
+        return np.array([np.nan if v is None else v for v in values], np.float64)
+    return np.array(values, dtype)
+
+
+def _convert(kind: str, values: list, decode) -> np.ndarray:
+    """Typed array of one page of stored values"""
+    if kind == "int":
+        return _numbers(values, np.int64)
+    if kind == "float":
+        return _numbers(values, np.float64)
+    if kind == "bool":
+        return np.array(values, object if None in values else np.bool_)
+    if kind in ("datetime", "date", "time"):
+        stored = _numbers(values, np.int64 if kind != "datetime" else np.float64)
+        missing = np.isnan(stored) if stored.dtype == np.float64 else None
+        if missing is not None:
+            stored = np.where(missing, 0, stored)
+        if kind == "datetime":
+            converted = np.round(stored * 1e6).astype(np.int64).astype("datetime64[us]")
+        elif kind == "date":
+            # stored as YYYYMMDD
+            stored = stored.astype(np.int64)
+            years = (stored // 10000 - 1970).astype("datetime64[Y]")
+            months = years.astype("datetime64[M]") + (stored // 100 % 100 - 1)
+            converted = months.astype("datetime64[D]") + (stored % 100 - 1)
+        else:
+            # stored as HHMMSSffffff
+            stored = stored.astype(np.int64)
+            seconds, micro = np.divmod(stored, 1000000)
+            converted = (
+                ((seconds // 10000 * 60 + seconds // 100 % 100) * 60 + seconds % 100)
+                * 1000000 + micro).astype("timedelta64[us]")
+        if missing is not None and missing.any():
+            converted[missing] = "NaT"
+        return converted
+    column = np.empty(len(values), object)
+    column[:] = [v if v is None or decode is None else decode(v) for v in values]
+    return column
+
+
+def to_columns(model, pages: Iterable[List[dict]], fields: Optional[List[str]] = None):
+    """Stream pages of raw records of `model` into a `Columns`"""
+    plan = {name: decode for name, decode, _ in model.__deserializers__}
+    names = list(plan) if fields is None else list(fields)
+    unknown = [name for name in names if name not in plan]
+    if unknown:
+        raise ValueError(f"{model.__name__} has no field {', '.join(unknown)}")
+    kinds = {name: _column_kind(model.__fields__[name]) for name in names}
+    chunks = {name: [] for name in names}
+    for page in pages:
+        if not page:
+            continue
+        for name in names:
+            values = [record.get(name) for record in page]
+            chunks[name].append(_convert(kinds[name], values, plan[name]))
+    columns = Columns()
+    for name in names:
+        if chunks[name]:
+            columns[name] = np.concatenate(chunks[name])
+        else:
+            columns[name] = _convert(kinds[name], [], plan[name])
+    return columns
+
+
+class Columns(dict):
+    """Field name to numpy array, all of the same length, with vectorized
+    aggregates"""
+
+    def count(self, field: Optional[str] = None) -> int:
+        """Number of rows, or of values present in `field`"""
+        if field is None:
+            return len(next(iter(self.values()))) if self else 0
+        return int(np.count_nonzero(~_missing(self[field])))
+
+    def sum(self, field: str):
+        return _scalar(np.nansum(_numeric(self[field])))
+
+    def mean(self, field: str):
+        values = _numeric(self[field])
+        if not np.count_nonzero(~np.isnan(values)):
+            return None
+        return _scalar(np.nanmean(values))
+
+    def group_by(self, by: str, field: Optional[str] = None,
+                 aggregate: str = "count") -> Dict:
+        """Aggregate `field` per distinct value of `by`, e.g.
+        `group_by("category", "price", "mean")`. Counts rows per group when
+        `field` is omitted, otherwise its values present."""
+        if aggregate not in AGGREGATES:
+            raise ValueError(f"aggregate must be one of {AGGREGATES}")
+        groups, inverse = _group_ids(self[by])
+        if field is None:
+            if aggregate != "count":
+                raise ValueError(f"'{aggregate}' needs a field")
+            totals = np.bincount(inverse, minlength=len(groups))
+            return dict(zip(groups, map(int, totals)))
+        values = _numeric(self[field]) if aggregate != "count" else None
+        present = ~_missing(self[field])
+        counts = np.bincount(inverse, weights=present, minlength=len(groups))
+        if aggregate == "count":
+            return dict(zip(groups, map(int, counts)))
+        sums = np.bincount(
+            inverse, weights=np.where(present, np.nan_to_num(values), 0),
+            minlength=len(groups))
+        if aggregate == "sum":
+            return dict(zip(groups, map(_scalar, sums)))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = sums / counts
+        return {
+            group: None if not count else _scalar(mean)
+            for group, count, mean in zip(groups, counts, means)}
+
+
+def _missing(column: np.ndarray) -> np.ndarray:
+    if column.dtype == object:
+        return np.array([v is None for v in column], np.bool_)
+    if column.dtype.kind in "fmM":
+        return np.isnan(column) if column.dtype.kind == "f" else np.isnat(column)
+    return np.zeros(len(column), np.bool_)
+
+
+def _numeric(column: np.ndarray) -> np.ndarray:
+    if column.dtype == object:
+        return np.array([np.nan if v is None else v for v in column], np.float64)
+    if column.dtype.kind in "mM":
+        raise TypeError("sum and mean need a numeric field")
+    return column.astype(np.float64)
+
+
+def _group_ids(column: np.ndarray):
+    """Distinct values of a column, and the index of each row's value among them"""
+    if column.dtype == object:
+        ids = {}
+        inverse = np.fromiter(
+            (ids.setdefault(v, len(ids)) for v in column), np.intp, len(column))
+        return list(ids), inverse
+    groups, inverse = np.unique(column, return_inverse=True)
+    return [_scalar(g) for g in groups], inverse.reshape(-1)
+
+
+def _scalar(value):
+    return value.item() if isinstance(value, np.generic) else value
@@ -0,0 +1,12 @@
+"""zstd compression of field values, see detamvc/codecs.py. Needs zstandard."""
+import zstandard
+
+LEVEL = 3
+
+
+def compress(data: bytes) -> bytes:
+    return zstandard.compress(data, LEVEL)
+
+
+def decompress(data: bytes) -> bytes:
+    return zstandard.decompress(data)
@@ -79,21 +79,59 @@ def __get_object_attrs(attributes: list) -> dict:
         obj_attrs[s[0]] = 'str' if len(s) == 1 else s[1].lower()
     return obj_attrs
 
-def __prepare_model_attrs(obj_attrs: dict) -> str:
+
+def __get_object_refs(attributes: list) -> dict:
+    """Get the referenced models of the attributes declared as "name:ref:Model".
+    
+    Args:
+        attributes (list): A list of strings representing object attributes.  
+        
+    Returns:
+        dict: A dictionary of the reference attribute names to the referenced model names.
+    """
+    refs = dict()
+    for a in attributes:
+        s = a.split(':')
+        if len(s) > 1 and s[1].lower() == 'ref':
+            if len(s) < 3 or not s[2]:
+                raise ValueError(f'Name the referenced model: "{s[0]}:ref:Model"')
+            refs[s[0]] = s[2].title()
+    return refs
+
+def __prepare_model_attrs(obj_attrs: dict, refs: dict) -> str:
     """Provides attributes for the DetaModel  
 
     Args:
         obj_attrs (dict): attributes dictionary  
+        refs (dict): referenced model of the reference attributes  
 
     Returns:
         str: prepared attributes as string
     """
     model_attrs = [
+        f'{k}: Ref["{refs[k]}"]' if k in refs else
         f"{k}: {'str' if v in ('text', 'wysiwyg') else v}" 
         for k, v in obj_attrs.items()]
     return '\n    '.join(model_attrs)
 
 
+def __prepare_model_config(obj_attrs: dict) -> str:
+    """Provides the extra Config lines of the DetaModel: long text is stored
+    compressed (see detamvc/codecs.py)
+
+    Args:
+        obj_attrs (dict): attributes dictionary  
+
+    Returns:
+        str: prepared Config lines as string
+    """
+    long_text = [k for k, v in obj_attrs.items() if v in ('text', 'wysiwyg')]
+    if not long_text:
+        return ''
+    codecs = ', '.join(f'"{k}": "zlib"' for k in long_text)
+    return f'\n        codecs = {{{codecs}}}'
+
+
 def __create_form_attrs(attributes: dict, helpers_path: str) -> str:
     """Create form field HTML for the specified attributes.  
     
@@ -117,6 +155,24 @@ def __create_form_attrs(attributes: dict, helpers_path: str) -> str:
         form_fields.append(__format(content, format_attrs))
     return '\n'.join(form_fields)
 
+def __create_ref_links(refs: dict, obj: str, helpers_path: str) -> str:
+    """Create the HTML showing the prefetched references on the index page.  
+    
+    Args:
+        refs (dict): referenced model of the reference attributes  
+        obj (str): the name of the scaffolded object  
+        helpers_path (str): The path to the directory containing the helper templates.  
+        
+    Returns:
+        str: The HTML for the reference links.
+    """
+    with open(Path(__file__).parent.resolve() / helpers_path / 'ref_link.html', 'r') as o:
+        content = o.read()
+    return ''.join(
+        __format(content, {'f': f, 'F': f.title(), 'obj': obj, 'target': model.lower()})
+        for f, model in refs.items())
+
+
 def __add_wysiwyg_meta(take_action: bool):
     if take_action:
         with open(Path(__file__).parent.resolve() 
@@ -173,20 +229,32 @@ def build_base(p: str, project_name: str, style: str) -> None:
         format_attrs=content_attrs)
 
 
-def gen_scaffold(p: str, obj: str, attributes: list) -> None:
+def gen_scaffold(p: str, obj: str, attributes: list, use_async: bool = False) -> None:
     """Generates Model, View, and Controller for a new Object.  
 
     Args:
         p (str): the current working directory  
         obj (str): the name of the new object to be created  
-        attributes (list): the attributes of the new object
+        attributes (list): the attributes of the new object  
+        use_async (bool, optional): generate `async` routes using the model's 
+            async API (see templates/scaffold_async/). Defaults to False.
     """
     obj_attrs = __get_object_attrs(attributes)
+    refs = __get_object_refs(attributes)
+    index_field = next(iter(obj_attrs), 'key')
     format_attrs = {
         'proj': Path.cwd().name,
         'obj': obj, 
         'Obj': obj.title(), 
-        'model_attrs': __prepare_model_attrs(obj_attrs), 
+        'model_imports': 'DetaModel, Ref' if refs else 'DetaModel',
+        'model_attrs': __prepare_model_attrs(obj_attrs, refs), 
+        'model_config': __prepare_model_config(obj_attrs),
+        # the column shown on the index page, the only field it reads with the
+        # references, which are fetched in one batch per page
+        'index_field': index_field,
+        'index_fields': [index_field] + [f for f in refs if f != index_field],
+        'index_prefetch': f', prefetch={list(refs)}' if refs else '',
+        'index_refs': __create_ref_links(refs, obj, 'templates/scaffold_helpers'),
         'form_attrs': __create_form_attrs(
             attributes=obj_attrs, 
             helpers_path='templates/scaffold_helpers'),
@@ -196,6 +264,12 @@ def gen_scaffold(p: str, obj: str, attributes: list) -> None:
         generator_path='templates/scaffold', 
         format_attrs=format_attrs,
         scaffold_obj_name=obj)
+    if use_async:
+        __builder(
+            project_path=p, 
+            generator_path='templates/scaffold_async', 
+            format_attrs=format_attrs,
+            scaffold_obj_name=obj)
     update(add_to_main(p, obj))
 
     
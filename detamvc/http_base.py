@@ -0,0 +1,281 @@
+"""Deta Base over one pooled, keep-alive HTTP session.
+
+The deta SDK opens its own connections for every Base. Select this client
+with `backend = "http"` on a model Config, or DETAMVC_BACKEND=http, and the
+Bases of every model share one httpx connection pool per configuration:
+
+    class Item(DetaModel):
+        class Config:
+            backend = "http"
+            http_max_connections = 20       # DETAMVC_HTTP_MAX_CONNECTIONS
+            http_max_keepalive = 10         # DETAMVC_HTTP_MAX_KEEPALIVE
+            http_keepalive_expiry = 30      # seconds, DETAMVC_HTTP_KEEPALIVE_EXPIRY
+            http_connect_timeout = 5        # seconds, DETAMVC_HTTP_CONNECT_TIMEOUT
+            http_read_timeout = 10          # seconds, DETAMVC_HTTP_READ_TIMEOUT
+
+Config attributes win over the environment variables. All the requests go to
+the one Deta Base host, so the connection limits are limits for that host.
+
+`pool_stats()` reports the requests in flight, how often a request found the
+pool full, and the connections and TLS handshakes each pool made. The
+/metrics route of detamvc/metrics.py serves them too.
+"""
+import os
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Union
+from urllib.parse import quote
+
+import httpx
+import ujson
+
+from detamvc.local_base import FetchResponse, Util, _expires
+
+DEFAULT_HOST = "database.deta.sh"
+
+
+@dataclass(frozen=True)
+class PoolSettings:
+    max_connections: int = 20
+    max_keepalive: int = 10
+    keepalive_expiry: float = 30.0
+    connect_timeout: float = 5.0
+    read_timeout: float = 10.0
+
+
+def pool_settings(config=None) -> PoolSettings:
+    """Settings from a model Config, then DETAMVC_HTTP_* variables, then defaults"""
+    values = {}
+    for name, default in PoolSettings.__dataclass_fields__.items():
+        value = getattr(config, f"http_{name}", None)
+        if value is None:
+            value = os.getenv(f"DETAMVC_HTTP_{name.upper()}")
+        if value is not None:
+            values[name] = type(default.default)(value)
+    return PoolSettings(**values)
+
+
+@dataclass
+class PoolStats:
+    requests: int = 0
+    in_flight: int = 0
+    peak_in_flight: int = 0
+    # requests started while every connection was busy
+    saturated: int = 0
+    connections_opened: int = 0
+    tls_handshakes: int = 0
+
+
+class Pool:
+    """One keep-alive httpx client, shared by threads, with usage counters"""
+
+    def __init__(self, settings: PoolSettings, transport=None):
+        self.settings = settings
+        self.stats = PoolStats()
+        self._lock = threading.Lock()
+        self.client = httpx.Client(
+            limits=httpx.Limits(
+                max_connections=settings.max_connections,
+                max_keepalive_connections=settings.max_keepalive,
+                keepalive_expiry=settings.keepalive_expiry),
+            timeout=httpx.Timeout(
+                settings.read_timeout, connect=settings.connect_timeout),
+            transport=transport)
+
+    def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        with self._lock:
+            stats = self.stats
+            stats.requests += 1
+            if stats.in_flight >= self.settings.max_connections:
+                stats.saturated += 1
+            stats.in_flight += 1
+            stats.peak_in_flight = max(stats.peak_in_flight, stats.in_flight)
+        try:
+            return self.client.request(
+                method, url, extensions={"trace": self._trace}, **kwargs)
+        finally:
+            with self._lock:
+                self.stats.in_flight -= 1
+
+    def _trace(self, event: str, info: dict) -> None:
+        if event == "connection.connect_tcp.complete":
+            with self._lock:
+                self.stats.connections_opened += 1
+        elif event == "connection.start_tls.complete":
+            with self._lock:
+                self.stats.tls_handshakes += 1
+
+    def close(self) -> None:
+        self.client.close()
+
+
+_pools: Dict[PoolSettings, Pool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(settings: Optional[PoolSettings] = None) -> Pool:
+    """The process-wide pool of these settings"""
+    settings = settings or pool_settings()
+    pool = _pools.get(settings)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(settings)
+            if pool is None:
+                pool = _pools[settings] = Pool(settings)
+    return pool
+
+
+def pool_stats() -> Dict[str, PoolStats]:
+    """Counters of every pool, by a label of its settings"""
+    return {_label(settings): pool.stats for settings, pool in list(_pools.items())}
+
+
+def prometheus_text() -> str:
+    """The pool counters in the Prometheus text exposition format"""
+    if not _pools:
+        return ""
+    metrics = (
+        ("requests", "counter", "Requests sent through the pool."),
+        ("in_flight", "gauge", "Requests waiting for a response."),
+        ("peak_in_flight", "gauge", "Most requests in flight at once."),
+        ("saturated", "counter", "Requests started while every connection was busy."),
+        ("connections_opened", "counter", "TCP connections opened."),
+        ("tls_handshakes", "counter", "TLS handshakes made."),
+    )
+    stats = pool_stats()
+    lines = []
+    for name, kind, help_text in metrics:
+        lines.append(f"# HELP detamvc_http_pool_{name} {help_text}")
+        lines.append(f"# TYPE detamvc_http_pool_{name} {kind}")
+        for label, values in stats.items():
+            lines.append(
+                f'detamvc_http_pool_{name}{{pool="{label}"}} {getattr(values, name)}')
+    return "\n".join(lines) + "\n"
+
+
+def _label(settings: PoolSettings) -> str:
+    return (
+        f"max={settings.max_connections},keepalive={settings.max_keepalive},"
+        f"timeout={settings.connect_timeout}/{settings.read_timeout}")
+
+
+class HttpDeta:
+    """Drop-in for `deta.Deta` whose Bases share a pool.
+
+    Args:
+        project_key (str): Deta project key.
+        settings (PoolSettings, optional): pool to use. Defaults to the one
+            configured by the environment.
+    """
+
+    def __init__(self, project_key: str, settings: Optional[PoolSettings] = None):
+        assert project_key, "No project key defined"
+        self.project_key = project_key
+        self.project_id = project_key.split("_")[0]
+        self.settings = settings
+
+    def Base(self, name: str, host: Optional[str] = None):
+        return HttpBase(name, self.project_key, get_pool(self.settings), host)
+
+
+class HttpBase:
+    """One Deta Base, spoken to through the Base HTTP API"""
+
+    def __init__(self, name: str, project_key: str, pool: Pool,
+                 host: Optional[str] = None):
+        host = host or os.getenv("DETA_BASE_HOST") or DEFAULT_HOST
+        self.name = name
+        self.util = Util()
+        self._pool = pool
+        self._url = f"https://{host}/v1/{project_key.split('_')[0]}/{name}"
+        self._headers = {"X-API-Key": project_key, "Content-Type": "application/json"}
+
+    def _request(self, method: str, path: str, payload=None) -> httpx.Response:
+        return self._pool.request(
+            method, self._url + path, headers=self._headers,
+            content=None if payload is None else ujson.dumps(payload))
+
+    @staticmethod
+    def _item_path(key: str) -> str:
+        if not key:
+            raise ValueError("Key is empty")
+        return "/items/" + quote(key, safe="")
+
+    # READS
+
+    def get(self, key: str) -> Optional[dict]:
+        response = self._request("GET", self._item_path(key))
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json()
+
+    def fetch(self, query: Union[dict, list, None] = None, limit: int = 1000,
+              last: Optional[str] = None) -> FetchResponse:
+        payload = {"limit": limit, "last": last}
+        if query:
+            payload["query"] = query if isinstance(query, list) else [query]
+        response = self._request("POST", "/query", payload)
+        response.raise_for_status()
+        body = response.json()
+        paging = body.get("paging", {})
+        return FetchResponse(paging.get("size", 0), paging.get("last"), body.get("items"))
+
+    # WRITES
+
+    def put(self, data, key: Optional[str] = None, expire_in: Optional[int] = None,
+            expire_at=None) -> dict:
+        result = self.put_many([self._item(data, key)], expire_in, expire_at)
+        return result["processed"]["items"][0]
+
+    def insert(self, data, key: Optional[str] = None, expire_in: Optional[int] = None,
+               expire_at=None) -> dict:
+        item = self._item(data, key, expire_in, expire_at)
+        response = self._request("POST", "/items", {"item": item})
+        if response.status_code == 409:
+            raise Exception(f"Item with key '{item.get('key')}' already exists")
+        response.raise_for_status()
+        return response.json()
+
+    def put_many(self, items: List, expire_in: Optional[int] = None,
+                 expire_at=None) -> dict:
+        assert len(items) <= 25, "We can't put more than 25 items at a time."
+        payload = {"items": [self._item(i, None, expire_in, expire_at) for i in items]}
+        response = self._request("PUT", "/items", payload)
+        response.raise_for_status()
+        return response.json()
+
+    def update(self, updates: dict, key: str, expire_in: Optional[int] = None,
+               expire_at=None) -> None:
+        payload = {"set": {}, "increment": {}, "append": {}, "prepend": {}, "delete": []}
+        for path, value in updates.items():
+            if isinstance(value, Util.Trim):
+                payload["delete"].append(path)
+            elif isinstance(value, Util.Increment):
+                payload["increment"][path] = value.val
+            elif isinstance(value, Util.Append):
+                payload["append"][path] = value.val
+            elif isinstance(value, Util.Prepend):
+                payload["prepend"][path] = value.val
+            else:
+                payload["set"][path] = value
+        expires = _expires(expire_in, expire_at)
+        if expires is not None:
+            payload["set"]["__expires"] = expires
+        response = self._request("PATCH", self._item_path(key), payload)
+        if response.status_code == 404:
+            raise Exception(f"Key '{key}' not found")
+        response.raise_for_status()
+
+    def delete(self, key: str) -> None:
+        self._request("DELETE", self._item_path(key)).raise_for_status()
+
+    @staticmethod
+    def _item(data, key, expire_in=None, expire_at=None) -> dict:
+        item = dict(data) if isinstance(data, dict) else {"value": data}
+        if key:
+            item["key"] = key
+        expires = _expires(expire_in, expire_at)
+        if expires is not None:
+            item["__expires"] = expires
+        return item
@@ -0,0 +1,214 @@
+"""Timing events for every Deta Base call and codec step of DetaModel.
+
+Subscribe a hook to receive an `Event` per call:
+
+    from detamvc import instrumentation
+
+    @instrumentation.subscribe
+    def log_slow(event):
+        if event.duration > 0.5:
+            print(event)
+
+or turn on the built-in histogram collector and serve it to Prometheus, along
+with the connection pool counters of detamvc/http_base.py, through the route
+of detamvc/metrics.py:
+
+    from detamvc.metrics import metrics_router
+
+    instrumentation.enable_metrics()
+    app.include_router(metrics_router)
+
+Nothing is measured while no hook is subscribed.
+"""
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Callable, List
+
+import ujson
+
+# upper bounds, in seconds, of the histogram buckets
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+@dataclass
+class Event:
+    model: str
+    operation: str
+    count: int
+    bytes: int
+    duration: float
+
+
+hooks: List[Callable[[Event], None]] = []
+
+
+def subscribe(hook: Callable[[Event], None]):
+    """Call `hook` with every event. Returns the hook, so it works as a decorator."""
+    if hook not in hooks:
+        hooks.append(hook)
+    return hook
+
+
+def unsubscribe(hook: Callable[[Event], None]) -> None:
+    if hook in hooks:
+        hooks.remove(hook)
+
+
+def emit(model: str, operation: str, count: int, size: int, started: float) -> None:
+    """Send an event, timed from `started` (a `time.perf_counter()` value)"""
+    event = Event(model, operation, count, size, time.perf_counter() - started)
+    for hook in hooks:
+        hook(event)
+
+
+def payload_size(payload) -> int:
+    """Bytes of `payload` once encoded as JSON"""
+    if payload is None:
+        return 0
+    try:
+        return len(ujson.dumps(payload))
+    except (TypeError, OverflowError):
+        # update() payloads hold Util operations, which are not JSON
+        return len(str(payload))
+
+
+class InstrumentedBase:
+    """Wraps a Base client and emits an event for each call"""
+
+    def __init__(self, base, model: str):
+        self._base = base
+        self._model = model
+
+    def __getattr__(self, name):
+        return getattr(self._base, name)
+
+    def get(self, key):
+        if not hooks:
+            return self._base.get(key)
+        started = time.perf_counter()
+        item = self._base.get(key)
+        emit(self._model, "get", int(item is not None), payload_size(item), started)
+        return item
+
+    def fetch(self, query=None, limit=1000, last=None):
+        if not hooks:
+            return self._base.fetch(query, limit=limit, last=last)
+        started = time.perf_counter()
+        response = self._base.fetch(query, limit=limit, last=last)
+        emit(self._model, "fetch", len(response.items), payload_size(response.items),
+             started)
+        return response
+
+    def put(self, data, key=None, expire_in=None, expire_at=None):
+        if not hooks:
+            return self._base.put(data, key, expire_in=expire_in, expire_at=expire_at)
+        started = time.perf_counter()
+        saved = self._base.put(data, key, expire_in=expire_in, expire_at=expire_at)
+        emit(self._model, "put", 1, payload_size(data), started)
+        return saved
+
+    def put_many(self, items, expire_in=None, expire_at=None):
+        if not hooks:
+            return self._base.put_many(items, expire_in=expire_in, expire_at=expire_at)
+        started = time.perf_counter()
+        result = self._base.put_many(items, expire_in=expire_in, expire_at=expire_at)
+        emit(self._model, "put_many", len(items), payload_size(items), started)
+        return result
+
+    def update(self, updates, key, expire_in=None, expire_at=None):
+        if not hooks:
+            return self._base.update(
+                updates, key, expire_in=expire_in, expire_at=expire_at)
+        started = time.perf_counter()
+        result = self._base.update(updates, key, expire_in=expire_in, expire_at=expire_at)
+        emit(self._model, "update", 1, payload_size(updates), started)
+        return result
+
+    def delete(self, key):
+        if not hooks:
+            return self._base.delete(key)
+        started = time.perf_counter()
+        result = self._base.delete(key)
+        emit(self._model, "delete", 1, 0, started)
+        return result
+
+
+class HistogramCollector:
+    """Keeps a duration histogram and item/byte totals per model and operation"""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._series = defaultdict(lambda: {
+                "buckets": [0] * len(self.buckets), "count": 0, "sum": 0.0,
+                "items": 0, "bytes": 0})
+
+    def __call__(self, event: Event) -> None:
+        with self._lock:
+            series = self._series[(event.model, event.operation)]
+            for i, bound in enumerate(self.buckets):
+                if event.duration <= bound:
+                    series["buckets"][i] += 1
+                    break
+            series["count"] += 1
+            series["sum"] += event.duration
+            series["items"] += event.count
+            series["bytes"] += event.bytes
+
+    def prometheus_text(self) -> str:
+        """The collected series in the Prometheus text exposition format"""
+        lines = [
+            "# HELP detamvc_operation_seconds Duration of Deta Base calls and codec steps.",
+            "# TYPE detamvc_operation_seconds histogram",
+        ]
+        totals = []
+        with self._lock:
+            for (model, operation), series in sorted(self._series.items()):
+                labels = f'model="{model}",operation="{operation}"'
+                cumulative = 0
+                for bound, hits in zip(self.buckets, series["buckets"]):
+                    cumulative += hits
+                    lines.append(
+                        f'detamvc_operation_seconds_bucket{{{labels},le="{bound}"}} '
+                        f'{cumulative}')
+                lines.append(
+                    f'detamvc_operation_seconds_bucket{{{labels},le="+Inf"}} '
+                    f'{series["count"]}')
+                lines.append(f'detamvc_operation_seconds_sum{{{labels}}} {series["sum"]}')
+                lines.append(
+                    f'detamvc_operation_seconds_count{{{labels}}} {series["count"]}')
+                totals.append((labels, series["items"], series["bytes"]))
+        lines += [
+            "# HELP detamvc_operation_items_total Items read, written or converted.",
+            "# TYPE detamvc_operation_items_total counter",
+        ]
+        lines += [f"detamvc_operation_items_total{{{l}}} {items}" for l, items, _ in totals]
+        lines += [
+            "# HELP detamvc_operation_bytes_total JSON bytes read, written or converted.",
+            "# TYPE detamvc_operation_bytes_total counter",
+        ]
+        lines += [f"detamvc_operation_bytes_total{{{l}}} {size}" for l, _, size in totals]
+        return "\n".join(lines) + "\n"
+
+
+collector = HistogramCollector()
+
+
+def enable_metrics() -> None:
+    """Feed every event to the built-in `collector`"""
+    subscribe(collector)
+
+
+def __getattr__(name):
+    # the route lives with FastAPI in detamvc/metrics.py, imported when asked for
+    if name == "metrics_router":
+        from detamvc.metrics import metrics_router
+
+        return metrics_router
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
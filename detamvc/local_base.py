@@ -0,0 +1,304 @@
+"""A local stand-in for Deta Base, stored in SQLite.
+
+It implements the part of the Deta Base client used by DetaModel: `get`,
+`put`, `insert`, `put_many`, `update`, `fetch` (with cursors and query
+operators), `delete` and the `expire_in`/`expire_at` arguments. Select it with
+the DETAMVC_BACKEND=local environment variable or `backend = "local"` on a
+model Config; the database file is DETAMVC_LOCAL_PATH, or
+`detamvc_local.sqlite3` in the working directory.
+
+Each Base is a table of JSON documents ordered by key. Query conditions run
+in SQL, and every field that is queried gets an expression index.
+"""
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Optional, Union
+
+DEFAULT_PATH = "detamvc_local.sqlite3"
+
+_OPERATORS = {"lt": "<", "gt": ">", "lte": "<=", "gte": ">="}
+
+
+class FetchResponse:
+    def __init__(self, count: int = 0, last: Optional[str] = None,
+                 items: Optional[list] = None):
+        self.count = count
+        self.last = last
+        self.items = items or []
+
+
+class Util:
+    """Update operations, used like `base.util.increment(1)`"""
+
+    class Trim:
+        pass
+
+    class Increment:
+        def __init__(self, value=1):
+            self.val = value
+
+    class Append:
+        def __init__(self, value):
+            self.val = value if isinstance(value, list) else [value]
+
+    class Prepend:
+        def __init__(self, value):
+            self.val = value if isinstance(value, list) else [value]
+
+    def trim(self):
+        return self.Trim()
+
+    def increment(self, value: Union[int, float] = 1):
+        return self.Increment(value)
+
+    def append(self, value):
+        return self.Append(value)
+
+    def prepend(self, value):
+        return self.Prepend(value)
+
+
+class LocalDeta:
+    """Drop-in for `deta.Deta` whose Bases live in one SQLite file.
+
+    Args:
+        path (str, optional): database file. Defaults to DETAMVC_LOCAL_PATH,
+            or `detamvc_local.sqlite3`.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = str(path or os.getenv("DETAMVC_LOCAL_PATH") or DEFAULT_PATH)
+
+    def Base(self, name: str):
+        return LocalBase(name, self.path)
+
+
+class LocalBase:
+    """One Deta Base. Instances are not shared between threads: DetaModel
+    opens one per thread, each with its own SQLite connection."""
+
+    # expression indexes already created, per database file and table
+    _indexed = set()
+    _indexed_lock = threading.Lock()
+
+    def __init__(self, name: str, path: str = DEFAULT_PATH):
+        self.name = name
+        self.path = path
+        self.util = Util()
+        self._table = '"' + name.replace('"', '""') + '"'
+        self._db = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            f"CREATE TABLE IF NOT EXISTS {self._table} "
+            "(key TEXT PRIMARY KEY, data TEXT NOT NULL, expires INTEGER) WITHOUT ROWID")
+
+    def close(self):
+        self._db.close()
+
+    # READS
+
+    def get(self, key: str) -> Optional[dict]:
+        row = self._db.execute(
+            f"SELECT data FROM {self._table} WHERE key = ? "
+            "AND (expires IS NULL OR expires > ?)",
+            (key, int(time.time()))).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def fetch(self, query: Union[dict, list, None] = None, limit: int = 1000,
+              last: Optional[str] = None) -> FetchResponse:
+        where = ["(expires IS NULL OR expires > ?)"]
+        params = [int(time.time())]
+        if last is not None:
+            where.append("key > ?")
+            params.append(last)
+        if query:
+            sql, query_params = self._query_sql(query)
+            where.append(sql)
+            params.extend(query_params)
+        params.append(limit + 1)
+        rows = self._db.execute(
+            f"SELECT key, data FROM {self._table} WHERE {' AND '.join(where)} "
+            "ORDER BY key LIMIT ?", params).fetchall()
+        more = len(rows) > limit
+        rows = rows[:limit]
+        items = [json.loads(data) for _, data in rows]
+        return FetchResponse(len(items), rows[-1][0] if more else None, items)
+
+    # WRITES
+
+    def put(self, data, key: Optional[str] = None, expire_in: Optional[int] = None,
+            expire_at=None) -> dict:
+        item = self._prepare(data, key, expire_in, expire_at)
+        self._write([item])
+        return item
+
+    def insert(self, data, key: Optional[str] = None, expire_in: Optional[int] = None,
+               expire_at=None) -> dict:
+        item = self._prepare(data, key, expire_in, expire_at)
+        if self.get(item["key"]) is not None:
+            raise Exception(f"Item with key '{item['key']}' already exists")
+        self._write([item])
+        return item
+
+    def put_many(self, items: list, expire_in: Optional[int] = None,
+                 expire_at=None) -> dict:
+        assert len(items) <= 25, "We can't put more than 25 items at a time."
+        prepared = [self._prepare(i, None, expire_in, expire_at) for i in items]
+        with self._transaction():
+            self._write(prepared)
+        return {"processed": {"items": prepared}}
+
+    def update(self, updates: dict, key: str, expire_in: Optional[int] = None,
+               expire_at=None) -> None:
+        with self._transaction():
+            item = self.get(key)
+            if item is None:
+                raise Exception(f"Key '{key}' not found")
+            for path, value in updates.items():
+                self._apply_update(item, path.split("."), value)
+            expires = _expires(expire_in, expire_at)
+            if expires is not None:
+                item["__expires"] = expires
+            self._write([item])
+
+    def delete(self, key: str) -> None:
+        self._db.execute(f"DELETE FROM {self._table} WHERE key = ?", (key,))
+
+    def purge_expired(self) -> int:
+        """Remove the expired items for good, returning how many there were"""
+        return self._db.execute(
+            f"DELETE FROM {self._table} WHERE expires <= ?",
+            (int(time.time()),)).rowcount
+
+    # HELPERS
+
+    @contextmanager
+    def _transaction(self):
+        # IMMEDIATE takes the write lock up front, so a read-modify-write
+        # cannot interleave with another connection
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        self._db.execute("COMMIT")
+
+    @staticmethod
+    def _prepare(data, key, expire_in, expire_at) -> dict:
+        item = dict(data) if isinstance(data, dict) else {"value": data}
+        if key:
+            item["key"] = key
+        if not item.get("key"):
+            item["key"] = secrets.token_hex(6)
+        expires = _expires(expire_in, expire_at)
+        if expires is not None:
+            item["__expires"] = expires
+        return item
+
+    def _write(self, items: List[dict]) -> None:
+        self._db.executemany(
+            f"INSERT OR REPLACE INTO {self._table} (key, data, expires) "
+            "VALUES (?, ?, ?)",
+            [(i["key"], json.dumps(i), i.get("__expires")) for i in items])
+
+    def _apply_update(self, item: dict, path: List[str], value) -> None:
+        for part in path[:-1]:
+            item = item.setdefault(part, {})
+        field = path[-1]
+        if isinstance(value, Util.Trim):
+            item.pop(field, None)
+        elif isinstance(value, Util.Increment):
+            item[field] = (item.get(field) or 0) + value.val
+        elif isinstance(value, Util.Append):
+            item[field] = (item.get(field) or []) + value.val
+        elif isinstance(value, Util.Prepend):
+            item[field] = value.val + (item.get(field) or [])
+        else:
+            item[field] = value
+
+    def _query_sql(self, query):
+        """Translate a Deta query, a dict of AND conditions or a list of those
+        combined with OR, into a SQL expression and its parameters"""
+        alternatives = query if isinstance(query, list) else [query]
+        clauses, params = [], []
+        for conditions in alternatives:
+            parts = []
+            for condition, value in conditions.items():
+                field, _, operator = condition.partition("?")
+                sql, condition_params = self._condition(field, operator, value)
+                parts.append(sql)
+                params.extend(condition_params)
+            clauses.append("(" + (" AND ".join(parts) or "1") + ")")
+        return "(" + " OR ".join(clauses) + ")", params
+
+    def _condition(self, field: str, operator: str, value):
+        column = self._column(field)
+        if operator in ("", "ne"):
+            if value is None:
+                sql = f"{column} IS NULL"
+            elif isinstance(value, (dict, list)):
+                sql, value = f"json({column}) = json(?)", json.dumps(value)
+            else:
+                sql = f"{column} = ?"
+            if operator == "ne":
+                sql = f"NOT coalesce({sql}, 0)"
+            return sql, [] if value is None else [value]
+        if operator in _OPERATORS:
+            return f"{column} {_OPERATORS[operator]} ?", [value]
+        if operator == "pfx":
+            return f"substr({column}, 1, length(?)) = ?", [value, value]
+        if operator == "r":
+            return f"{column} BETWEEN ? AND ?", [value[0], value[1]]
+        if operator in ("contains", "not_contains"):
+            path = self._path(field)
+            sql = (
+                f"CASE json_type(data, '{path}') "
+                f"WHEN 'array' THEN EXISTS (SELECT 1 FROM json_each(data, '{path}') "
+                "WHERE json_each.value = ?) "
+                f"WHEN 'text' THEN instr({column}, ?) > 0 ELSE 0 END")
+            if operator == "not_contains":
+                sql = f"NOT ({sql})"
+            return sql, [value, value]
+        raise ValueError(f"Unsupported query operator '{operator}'")
+
+    def _column(self, field: str) -> str:
+        if field == "key":
+            return "key"
+        expression = f"json_extract(data, '{self._path(field)}')"
+        self._ensure_index(field, expression)
+        return expression
+
+    @staticmethod
+    def _path(field: str) -> str:
+        if '"' in field or "'" in field:
+            raise ValueError(f"Unsupported field name '{field}'")
+        return "$" + "".join(f'."{part}"' for part in field.split("."))
+
+    def _ensure_index(self, field: str, expression: str) -> None:
+        marker = (self.path, self.name, field)
+        if marker in self._indexed:
+            return
+        with self._indexed_lock:
+            index = '"' + f"{self.name}__{field}".replace('"', '""') + '"'
+            self._db.execute(
+                f"CREATE INDEX IF NOT EXISTS {index} ON {self._table} ({expression})")
+            self._indexed.add(marker)
+
+
+def _expires(expire_in, expire_at) -> Optional[int]:
+    if expire_in is not None and expire_at is not None:
+        raise ValueError("'expire_in' and 'expire_at' are mutually exclusive")
+    if expire_in is not None:
+        return int(time.time()) + int(expire_in)
+    if expire_at is None:
+        return None
+    if hasattr(expire_at, "timestamp"):
+        return int(expire_at.timestamp())
+    return int(expire_at)
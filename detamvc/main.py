@@ -1,8 +1,9 @@
 import typer
+import json
 import os
 from detamvc import __version__
 from detamvc.generator import build_base, gen_scaffold, gen_authlib
-from typing import List
+from typing import List, Optional
 import detamvc.utilities as utils
 
 app = typer.Typer()
@@ -30,14 +31,20 @@ def new(project: str, style: str = "bootstrap"):
             "Valid options are: {utils.STYLES}", fg='red')
 
 @app.command()
-def server():
+def server(
+    local: bool = typer.Option(
+        False, "--local", help="use a local SQLite stand-in for Deta Base")
+):
     """ run the app locally """
-    utils.run_server()
+    utils.run_server(local)
 
 @app.command()
-def s():
+def s(
+    local: bool = typer.Option(
+        False, "--local", help="use a local SQLite stand-in for Deta Base")
+):
     """ alias for 'server' """
-    server()
+    server(local)
 
 @app.command()
 def build():
@@ -45,13 +52,17 @@ def build():
     os.system("mkdocs build")
 
 @app.command()
-def scaffold(obj: str, attributes: List[str]):
+def scaffold(
+    obj: str, 
+    attributes: List[str], 
+    use_async: bool = typer.Option(False, "--async", help="generate async routes")
+):
     """ create a router and views for a described object """
     if utils.check_project_type() == "MKDOCS":
         typer.secho(f"Scaffolding is not currently supported for MKDOCS styled apps", fg='red')
     else:
         typer.secho(f"\nScaffolding views and router for: {obj}\n", fg='green')
-        gen_scaffold(os.curdir, obj, attributes)
+        gen_scaffold(os.curdir, obj, attributes, use_async)
         typer.echo(f"\n{obj} was created.\n")
 
 @app.command()
@@ -81,3 +92,73 @@ def view_config():
     """ view your development configurations """
     conf = utils.config()
     typer.echo(conf)
+
+@app.command()
+def rebuild_indexes(model: str = typer.Argument(..., help="model to index, as module.path:ClassName")):
+    """ rebuild the secondary indexes of a model from its stored records """
+    model_class = utils.import_model(model)
+    if not model_class.__indexes__:
+        typer.secho(f"{model} has no indexes, see Config.indexes", fg='yellow')
+        raise typer.Exit(1)
+    indexed = model_class.rebuild_indexes()
+    typer.secho(f"Indexed {indexed} records on {', '.join(model_class.__indexes__)}", fg='green')
+
+@app.command()
+def delete_where(
+    model: str = typer.Argument(..., help="model to delete from, as module.path:ClassName"),
+    query: str = typer.Argument(..., help='Deta query as JSON, e.g. \'{"created?lt": 1672531200}\''),
+    dry_run: bool = typer.Option(False, "--dry-run", help="only count the matching records"),
+    concurrency: int = typer.Option(8, help="deletes in flight")
+):
+    """ delete every record of a model matching a query """
+    model_class = utils.import_model(model)
+    verb = "Matched" if dry_run else "Deleted"
+
+    def progress(matched, deleted):
+        typer.echo(f"{matched} matched, {deleted} deleted")
+
+    count = model_class.delete_where(
+        json.loads(query), concurrency=concurrency, dry_run=dry_run, progress=progress)
+    typer.secho(f"{verb} {count} records", fg='green')
+
+@app.command()
+def reshard(
+    model: str = typer.Argument(..., help="model to reshard, as module.path:ClassName"),
+    concurrency: int = typer.Option(8, help="records moved at once")
+):
+    """ move the records of a model from Config.previous_shards to Config.shards """
+    model_class = utils.import_model(model)
+    if model_class._sharded is None or model_class._sharded.previous is None:
+        typer.secho(f"{model} is not being resharded, see Config.previous_shards", fg='yellow')
+        raise typer.Exit(1)
+
+    def progress(scanned, moved):
+        typer.echo(f"{scanned} scanned, {moved} moved")
+
+    moved = model_class.reshard(concurrency=concurrency, progress=progress)
+    typer.secho(
+        f"Moved {moved} records to {len(model_class._sharded.names)} shards", fg='green')
+
+@app.command()
+def bench(
+    suite: List[str] = typer.Option(
+        ["codec", "model", "app"], help="suites to run: codec, model, app"),
+    rows: Optional[int] = typer.Option(None, help="rows per suite"),
+    output: Optional[str] = typer.Option(None, help="write the results to this JSON file"),
+    compare: Optional[str] = typer.Option(None, help="JSON results of an earlier run")
+):
+    """ benchmark the model layer and a generated app """
+    from detamvc import benchmarks
+
+    results = benchmarks.run(suite, rows)
+    typer.echo(json.dumps(results["results"], indent=4))
+    if output:
+        with open(output, 'w') as o:
+            o.write(json.dumps(results, indent=4))
+        typer.secho(f"Results written to {output}", fg='green')
+    if compare:
+        with open(compare, 'r') as c:
+            previous = json.loads(c.read())
+        for name, metric, before, after, ratio in benchmarks.compare(previous, results):
+            color = 'red' if ratio > 1.1 else 'green' if ratio < 0.9 else None
+            typer.secho(f"{name:45} {metric:8} {before:>12} -> {after:<12} x{ratio}", fg=color)
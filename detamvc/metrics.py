@@ -0,0 +1,23 @@
+"""The /metrics route: the events collected by detamvc/instrumentation.py
+and the connection pool counters of detamvc/http_base.py, in the Prometheus
+text format.
+
+    from detamvc.instrumentation import enable_metrics
+    from detamvc.metrics import metrics_router
+
+    enable_metrics()
+    app.include_router(metrics_router)
+
+Kept apart from the instrumentation so the model layer works without FastAPI.
+"""
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from detamvc import http_base, instrumentation
+
+metrics_router = APIRouter()
+
+
+@metrics_router.get('/metrics', response_class=PlainTextResponse)
+def metrics():
+    return instrumentation.collector.prometheus_text() + http_base.prometheus_text()
@@ -1,16 +1,35 @@
+import asyncio
 import datetime
+import functools
+import hashlib
 import os
 import re
-from typing import Optional, Union, List
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Optional, Union, List
 
 import pydantic
 import ujson
 from deta import Deta
-from pydantic import Field, BaseModel, ValidationError
+from pydantic import Field, BaseModel, PrivateAttr, ValidationError
+from pydantic.fields import SHAPE_DICT, SHAPE_LIST, SHAPE_MAPPING, SHAPE_SINGLETON
 
 from odetam.field import DetaField
 from odetam.query import DetaQuery, DetaQueryStatement, DetaQueryList
 
+from detamvc import codecs, instrumentation
+from detamvc.cache import (
+    CacheStats, FlightStats, LRUCache, SingleFlight, normalize_query)
+from detamvc.http_base import HttpDeta, pool_settings
+from detamvc.local_base import LocalDeta
+from detamvc.queryset import QuerySet
+from detamvc.records import RecordSet, record_class
+from detamvc.relations import Ref, register_model
+from detamvc.sharding import ShardedBase
+from detamvc.write_behind import WriteBehindBuffer, WriteBehindStats
+
 
 class DetaError(BaseException):
     pass
@@ -28,6 +47,26 @@ class InvalidDetaQuery(DetaError):
     pass
 
 
+@dataclass
+class BatchFailure:
+    """A batch that still failed after its retries"""
+    index: int
+    items: list
+    error: BaseException
+
+
+class BatchError(DetaError):
+    """Raised once every batch has been attempted and some of them failed.
+
+    `processed` holds the results of the batches that succeeded, in input order,
+    and `failures` the `BatchFailure` of every batch that did not.
+    """
+    def __init__(self, message, processed: list, failures: List[BatchFailure]):
+        super().__init__(message)
+        self.processed = processed
+        self.failures = failures
+
+
 DETA_BASIC_TYPES = [dict, list, str, int, float, bool]
 DETA_OPTIONAL_TYPES = [Optional[type_] for type_ in DETA_BASIC_TYPES]
 DETA_BASIC_LIST_TYPES = [
@@ -35,6 +74,18 @@ DETA_BASIC_LIST_TYPES = [
 ]
 DETA_TYPES = DETA_BASIC_TYPES + DETA_OPTIONAL_TYPES + DETA_BASIC_LIST_TYPES
 
+# Deta caps a single fetch at 1000 items; pages are requested at most this large
+DEFAULT_PAGE_SIZE = 1000
+# items per page of get_page
+DEFAULT_PAGE_LIMIT = 24
+# Deta accepts at most 25 items per put_many request
+PUT_MANY_BATCH_SIZE = 25
+# default number of requests in flight for the bulk reads
+DEFAULT_CONCURRENCY = 8
+MISSING_POLICIES = ("raise", "skip", "none")
+# what the reads return for each record, see DetaModel.get_all
+OUTPUTS = ("model", "dict", "tuple", "record")
+
 
 class Alert:
     """Use this class to make alerts on any page"""
@@ -43,9 +94,386 @@ class Alert:
         self.message = message
 
 
-def handle_db_property(cls, deta_class):
-    if cls._db:
-        return cls._db
+def _encode_datetime(value):
+    return value.timestamp()
+
+
+def _encode_date(value):
+    # same integer as int(value.strftime("%Y%m%d"))
+    return value.year * 10000 + value.month * 100 + value.day
+
+
+def _encode_time(value):
+    # same integer as int(value.strftime("%H%M%S%f"))
+    return (
+        (value.hour * 100 + value.minute) * 100 + value.second
+    ) * 1000000 + value.microsecond
+
+
+def _decode_date(value):
+    value = int(value)
+    return datetime.date(value // 10000, value // 100 % 100, value % 100)
+
+
+def _decode_time(value):
+    seconds, microsecond = divmod(int(value), 1000000)
+    return datetime.time(
+        seconds // 10000, seconds // 100 % 100, seconds % 100, microsecond
+    )
+
+
+def _decode_json(value):
+    try:
+        return ujson.loads(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def _json_encoder(cls, field):
+    """Encode any other value of `field` exactly like `cls.json()` would,
+    without building and dumping the whole model."""
+    type_ = field.type_
+    dumps = cls.__config__.json_dumps
+    default = cls.__json_encoder__
+
+    def encode(value):
+        return ujson.loads(dumps(value, default=default))
+
+    if (
+        field.shape == SHAPE_SINGLETON
+        and isinstance(type_, type)
+        and issubclass(type_, BaseModel)
+        and not cls.__config__.json_encoders
+        and not type_.__config__.json_encoders
+        and all(field.type_ in DETA_TYPES for field in type_.__fields__.values())
+    ):
+        # a nested model made only of JSON types dumps to the same data as .dict();
+        # lists and dicts of them, and plain dicts assigned to the field, go
+        # through the generic encoder
+        as_dict = type_.dict
+
+        def encode_model(value):
+            return as_dict(value) if isinstance(value, type_) else encode(value)
+
+        return encode_model
+    return encode
+
+
+def _field_codec(cls, field, codec, encode, decode, min_size):
+    """Encoder and decoder of a field with a codec, see detamvc/codecs.py"""
+    if codec not in codecs.CODECS:
+        raise ValueError(f"codec must be one of {codecs.CODECS}")
+    if codec != "json":
+        return codecs.field_codec(codec, encode, decode, min_size)
+    # the model's own json_encoders are only applied by the generic encoder
+    if decode is _decode_json and not cls.__config__.json_encoders:
+        encode = codecs.fast_json_encoder(field, cls.__json_encoder__)
+    return encode, codecs.unwrap_decoder(decode)
+
+
+def _compile_codec(cls):
+    """Resolve the type dispatch of `_serialize` and `_deserialize` once per class.
+
+    :returns: a tuple of `(field name, encoder)` pairs and a tuple of
+        `(field name, decoder, missing value factory)` triples. An encoder or
+        decoder of `None` means the value is stored as is.
+    """
+    serializers = []
+    deserializers = []
+    field_codecs = getattr(cls.Config, "codecs", None) or {}
+    unknown = set(field_codecs) - set(cls.__fields__)
+    if unknown:
+        raise ValueError(f"{cls.__name__} has no field {', '.join(sorted(unknown))}")
+    min_size = getattr(cls.Config, "compress_min_size", codecs.DEFAULT_COMPRESS_MIN_SIZE)
+    for field_name, field in cls.__fields__.items():
+        type_ = field.type_
+        if type_ in DETA_TYPES or isinstance(type_, type) and issubclass(type_, Ref):
+            # references are stored as the key they hold
+            encode, decode = None, None
+        elif type_ == datetime.datetime:
+            encode, decode = _encode_datetime, datetime.datetime.fromtimestamp
+        elif type_ == datetime.date:
+            encode, decode = _encode_date, _decode_date
+        elif type_ == datetime.time:
+            encode, decode = _encode_time, _decode_time
+        else:
+            encode, decode = _json_encoder(cls, field), _decode_json
+        codec = field_codecs.get(field_name)
+        if codec is not None:
+            encode, decode = _field_codec(cls, field, codec, encode, decode, min_size)
+        if field_name != "key":
+            serializers.append((field_name, encode))
+        deserializers.append((field_name, decode, type_))
+    return tuple(serializers), tuple(deserializers)
+
+
+def _is_model(type_) -> bool:
+    return isinstance(type_, type) and issubclass(type_, BaseModel)
+
+
+def _holds_model(field) -> bool:
+    return _is_model(field.type_) or any(map(_holds_model, field.sub_fields or ()))
+
+
+def _field_constructor(field):
+    """Function building the nested models of a field from their stored dicts
+    without validation, None for a field holding no model. Fields holding
+    models otherwise than as a model, a list or a dict of them (tuples,
+    unions...) are validated."""
+    if not _holds_model(field):
+        return None
+    if not (
+        _is_model(field.type_)
+        and field.shape in (SHAPE_SINGLETON, SHAPE_LIST, SHAPE_DICT, SHAPE_MAPPING)
+    ):
+        def validate(value):
+            validated, errors = field.validate(value, {}, loc=field.name)
+            return value if errors else validated
+
+        return validate
+    build = _model_constructor(field.type_)
+    if field.shape == SHAPE_LIST:
+        return lambda values: [build(value) for value in values]
+    if field.shape != SHAPE_SINGLETON:
+        return lambda values: {key: build(value) for key, value in values.items()}
+    return build
+
+
+@functools.lru_cache(maxsize=None)
+def _model_constructor(model):
+    """Function building a nested model, and the models within it, with
+    `construct`. Its fields are resolved on the first call, so models can
+    nest themselves."""
+    steps = None
+
+    def build(value):
+        nonlocal steps
+        if not isinstance(value, dict):
+            return value
+        if steps is None:
+            steps = _constructors(model)
+        return model.construct(**_construct_nested(steps, value))
+
+    return build
+
+
+def _constructors(model):
+    """`(field name, constructor)` pairs of the fields of a model holding models"""
+    steps = []
+    for name, field in model.__fields__.items():
+        construct = _field_constructor(field)
+        if construct is not None:
+            steps.append((name, construct))
+    return tuple(steps)
+
+
+def _mutable_fields(model):
+    """Names of the fields whose values can be changed in place: lists, dicts
+    and nested models"""
+    return tuple(
+        name for name, field in model.__fields__.items()
+        if name != "key" and (
+            field.shape != SHAPE_SINGLETON
+            or field.type_ in (list, dict, set) or _is_model(field.type_)))
+
+
+def _construct_nested(steps, values):
+    """Values with the nested models of `steps` built, for `construct`"""
+    if not steps:
+        return values
+    values = dict(values)
+    for name, construct in steps:
+        value = values.get(name)
+        if value is not None:
+            values[name] = construct(value)
+    return values
+
+
+def _compile_reader(cls, fields, output):
+    """Build the function turning a raw record into a projection on `fields`
+    (every field when None), returned as a partial model, dict, tuple or row.
+
+    Only the requested fields are converted, and nothing is validated. Each
+    conversion is timed as a "deserialize" event while hooks are subscribed.
+    """
+    read = _compile_projection(cls, fields, output)
+    model = cls.__name__
+
+    def timed_read(record):
+        if not instrumentation.hooks:
+            return read(record)
+        started = time.perf_counter()
+        item = read(record)
+        instrumentation.emit(
+            model, "deserialize", 1, instrumentation.payload_size(record), started)
+        return item
+
+    return timed_read
+
+
+def _compile_projection(cls, fields, output):
+    if output not in OUTPUTS:
+        raise ValueError(f"output must be one of {OUTPUTS}")
+    plan = {name: (decode, missing) for name, decode, missing in cls.__deserializers__}
+    names = list(plan) if fields is None else list(fields)
+    unknown = [name for name in names if name not in plan]
+    if unknown:
+        raise ValueError(f"{cls.__name__} has no field {', '.join(unknown)}")
+    if output != "tuple" and "key" not in names:
+        names.insert(0, "key")
+    steps = tuple((name, *plan[name]) for name in names)
+
+    def convert(record):
+        values = []
+        for name, decode, missing in steps:
+            if name not in record:
+                values.append(missing())
+                continue
+            value = record[name]
+            values.append(value if value is None or decode is None else decode(value))
+        return values
+
+    if output == "tuple":
+        return lambda record: tuple(convert(record))
+    if output == "dict":
+        return lambda record: dict(zip(names, convert(record)))
+    if output == "record":
+        row = cls.__record__
+        if fields is None:
+            # rows hold every field in the order of `names`
+            return lambda record: row(*convert(record))
+        blank = dict.fromkeys(row._fields)
+        return lambda record: row(*{**blank, **dict(zip(names, convert(record)))}.values())
+    blank = dict.fromkeys(cls.__fields__)
+    fields_set = set(names)
+    nested = tuple(step for step in cls.__constructors__ if step[0] in fields_set)
+
+    def read_model(record):
+        values = _construct_nested(nested, dict(zip(names, convert(record))))
+        item = cls.construct(fields_set, **{**blank, **values})
+        item._stored = True
+        item._partial = fields is not None
+        item._remember(record, fields_set)
+        return item
+
+    return read_model
+
+
+def _call_with_retries(fn, batch, retries, backoff):
+    attempt = 0
+    while True:
+        try:
+            return fn(batch)
+        except (Exception, DetaError) as e:
+            if attempt >= retries:
+                return e
+            time.sleep(backoff * 2 ** attempt)
+            attempt += 1
+
+
+# set on the threads running batches, whose nested batches run inline
+_batch_thread = threading.local()
+
+
+def run_batches(fn, batches: list, concurrency: int = 1, retries: int = 0,
+                backoff: float = 0.5, pool: Optional[ThreadPoolExecutor] = None
+                ) -> List[Any]:
+    """Call `fn` once per batch, with up to `concurrency` calls in flight when
+    it is above 1.
+
+    The calls run on `pool` when given, so its threads and their Base
+    connections are reused, or else on a pool made for this call. Batches
+    started from a batch thread run one after the other on it: a nested call
+    never waits for a thread of a pool it may be holding.
+
+    Failed calls are retried `retries` times, waiting `backoff` seconds before
+    the first retry and doubling the wait after each one.
+
+    :returns: one entry per batch, in input order: the value returned by `fn`,
+        or the exception raised by its last attempt.
+    """
+    def call(batch):
+        return _call_with_retries(fn, batch, retries, backoff)
+
+    if concurrency <= 1 or len(batches) <= 1 or getattr(_batch_thread, "active", False):
+        return [call(b) for b in batches]
+    if pool is None:
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(batches))) as pool:
+            return list(pool.map(call, batches))
+    results = [None] * len(batches)
+    pending = iter(range(len(batches)))
+    lock = threading.Lock()
+
+    def lane():
+        # each lane takes the next batch once done with its own
+        _batch_thread.active = True
+        try:
+            while True:
+                with lock:
+                    index = next(pending, None)
+                if index is None:
+                    return
+                results[index] = call(batches[index])
+        finally:
+            _batch_thread.active = False
+
+    for running in [pool.submit(lane) for _ in range(min(concurrency, len(batches)))]:
+        running.result()
+    return results
+
+
+_executor_lock = threading.Lock()
+
+
+def _lookup(record, field):
+    """Value of a possibly nested ("a.b") field of a raw record"""
+    for part in field.split("."):
+        if not isinstance(record, dict):
+            return None
+        record = record.get(part)
+    return record
+
+
+def handle_cache(cls, kind="cache"):
+    """Build the cache configured on the model, if any.
+
+    `kind` is "cache" for records by key, or "query_cache" for query results.
+    """
+    size = getattr(cls.Config, f"{kind}_size", None)
+    if not size:
+        return None
+    backend = getattr(cls.Config, "cache_backend", LRUCache)
+    ttl = getattr(cls.Config, f"{kind}_ttl", getattr(cls.Config, "cache_ttl", None))
+    namespace = cls.__db_name__ if kind == "cache" else f"{cls.__db_name__}:{kind}"
+    return backend(namespace, size, ttl)
+
+
+def handle_single_flight(cls):
+    """Share concurrent identical reads, unless `Config.single_flight` is False"""
+    if not getattr(cls.Config, "single_flight", True):
+        return None
+    return SingleFlight()
+
+
+def handle_write_behind(cls):
+    """Build the write-behind buffer configured on the model, if any"""
+    if not getattr(cls.Config, "write_behind", False):
+        return None
+    return WriteBehindBuffer(
+        lambda chunks: run_batches(cls._db_put_many, chunks),
+        getattr(cls.Config, "write_behind_batch", PUT_MANY_BATCH_SIZE),
+        getattr(cls.Config, "write_behind_interval", 1.0),
+        getattr(cls.Config, "write_behind_queue", 10_000))
+
+
+def open_base(cls, deta_class, name):
+    """Build an instrumented Base client called `name` on the model's backend"""
+    backend = getattr(cls.Config, "backend", None) or os.getenv("DETAMVC_BACKEND")
+    if backend == "local":
+        return instrumentation.InstrumentedBase(LocalDeta().Base(name), cls.__name__)
+    if backend == "http":
+        # every Base shares one pooled session, see detamvc/http_base.py
+        deta_class = functools.partial(HttpDeta, settings=pool_settings(cls.Config))
     try:
         # changed to 'DETA_PROJECT_KEY' because Deta SDK searches for it by default
         # https://github.com/deta/deta-python/blob/master/deta/utils.py
@@ -55,8 +483,28 @@ def handle_db_property(cls, deta_class):
             "Ensure that the 'DETA_PROJECT_KEY' environment variable is set to your "
             "project key and then restart the server."
         )
-    cls._db = deta.Base(cls.__db_name__)
-    return cls._db
+    return instrumentation.InstrumentedBase(deta.Base(name), cls.__name__)
+
+
+def handle_sharding(cls):
+    """Build the sharded Base of the model, if `Config.shards` spreads it over
+    several Bases or `Config.previous_shards` is set during a reshard"""
+    shards = getattr(cls.Config, "shards", None) or 1
+    previous = getattr(cls.Config, "previous_shards", None)
+    if shards <= 1 and not previous:
+        return None
+    return ShardedBase(
+        lambda name: handle_db_property(cls, Deta, f"shard:{name}", name),
+        cls.__db_name__, shards, previous)
+
+
+def handle_db_property(cls, deta_class, attr="base", name=None):
+    # the Base client keeps a single HTTP connection, so every thread gets its own
+    base = getattr(cls._db, attr, None)
+    if base is None:
+        base = open_base(cls, deta_class, name or cls.__db_name__)
+        setattr(cls._db, attr, base)
+    return base
 
 
 class DetaModelMetaClass(pydantic.main.ModelMetaclass):
@@ -67,7 +515,27 @@ class DetaModelMetaClass(pydantic.main.ModelMetaclass):
             cls.__db_name__ = cls.Config.table_name
         else:
             cls.__db_name__ = re.sub(r"(?<!^)(?=[A-Z])", "_", name).lower()
-        cls._db = None
+        cls._db = threading.local()
+        cls._executor = None
+        cls._batch_pool = None
+        cls._cache = handle_cache(cls)
+        cls._readers = {}
+        cls._query_cache = handle_cache(cls, "query_cache")
+        cls._single_flight = handle_single_flight(cls)
+        cls._write_behind = handle_write_behind(cls)
+        cls._sharded = handle_sharding(cls)
+        cls.__indexes__ = tuple(getattr(cls.Config, "indexes", ()))
+
+        cls.__serializers__, cls.__deserializers__ = _compile_codec(cls)
+        cls.__constructors__ = _constructors(cls)
+        cls.__mutable__ = _mutable_fields(cls)
+        cls.__record__ = record_class(cls)
+        cls.__refs__ = {
+            name: (field.type_, field.shape != SHAPE_SINGLETON)
+            for name, field in cls.__fields__.items()
+            if isinstance(field.type_, type) and issubclass(field.type_, Ref)
+        }
+        register_model(cls)
 
         for name, field in cls.__fields__.items():
             setattr(cls, name, DetaField(field=field))
@@ -75,78 +543,175 @@ class DetaModelMetaClass(pydantic.main.ModelMetaclass):
 
     @property
     def __db__(cls):
+        if cls._sharded is not None:
+            # routes each key to its shard, see detamvc/sharding.py
+            return cls._sharded
         return handle_db_property(cls, Deta)
 
+    @property
+    def objects(cls) -> QuerySet:
+        """Lazy query on every record, narrowed with `filter`, see
+        detamvc/queryset.py"""
+        return QuerySet(cls)
+
+    @property
+    def __index_db__(cls):
+        """Companion Base holding the secondary indexes, see `Config.indexes`"""
+        return handle_db_property(cls, Deta, "index_base", f"{cls.__db_name__}__index")
+
 
 class BaseDetaModel(BaseModel):
     __db__ = None
+    __indexes__ = ()
+    __serializers__ = ()
+    __deserializers__ = ()
+    __constructors__ = ()
+    __mutable__ = ()
+    __record__ = None
+    __refs__ = {}
     key: Optional[str] = Field(
         None, title="Key", description="Primary key in the database"
     )
+    # fields assigned since the record was loaded or saved, see `update`
+    _dirty: set = PrivateAttr(default_factory=set)
+    # stored JSON of the `__mutable__` fields, to find changes made in place
+    _snapshot: Optional[dict] = PrivateAttr(None)
+    # whether the object mirrors a stored record
+    _stored: bool = PrivateAttr(False)
+    # whether it was read with a projection, so only holds some of the fields
+    _partial: bool = PrivateAttr(False)
+    # referenced objects by field name, see `related`
+    _related: dict = PrivateAttr(default_factory=dict)
+
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        if name in self.__fields__ and name != "key":
+            self._dirty.add(name)
 
     # overwriting odetam's implementation
-    def _serialize(self, exclude=None):
+    def _serialize(self, exclude=None, include=None):
+        if not instrumentation.hooks:
+            return self._encode(exclude, include)
+        started = time.perf_counter()
+        as_dict = self._encode(exclude, include)
+        instrumentation.emit(
+            self.__class__.__name__, "serialize", 1, instrumentation.payload_size(as_dict),
+            started)
+        return as_dict
+
+    def _remember(self, record, names=None):
+        """Keep the JSON of the `__mutable__` fields of a stored record, or of
+        its `names` fields, see `_changed_in_place`"""
+        mutable = self.__mutable__
+        if names is not None:
+            mutable = [name for name in mutable if name in names]
+        if not mutable:
+            return
+        if self._snapshot is None:
+            self._snapshot = {}
+        for name in mutable:
+            self._snapshot[name] = ujson.dumps(record.get(name))
+
+    def _changed_in_place(self) -> set:
+        """`__mutable__` fields whose value no longer matches the stored one,
+        e.g. a list appended to without being assigned"""
+        if not self._snapshot:
+            return set()
+        current = self._encode(include=self._snapshot)
+        return {
+            name for name, stored in self._snapshot.items()
+            if ujson.dumps(current[name]) != stored
+        }
+
+    def _encode(self, exclude=None, include=None):
+        """Convert the field values into a Deta record, or only the `include`
+        fields of it"""
         if not exclude:
-            exclude = []
+            exclude = ()
+        values = self.__dict__
         as_dict = {}
-        for field_name, field in self.__class__.__fields__.items():
-            if field_name == "key" and not self.key:
-                continue
-            if field_name in exclude:
+        for field_name, encode in self.__serializers__:
+            if field_name in exclude or (include is not None and field_name not in include):
                 continue
+            value = values.get(field_name)
             # this originally failed when 0, 0.0, or False. Now we only check for None instances
-            if getattr(self, field_name, None) is None:
-                as_dict[field_name] = None
-                continue
-            if field.type_ in DETA_TYPES:
-                as_dict[field_name] = getattr(self, field_name)
-            elif field.type_ == datetime.datetime:
-                as_dict[field_name] = getattr(self, field_name).timestamp()
-            elif field.type_ == datetime.date:
-                as_dict[field_name] = int(getattr(self, field_name).strftime("%Y%m%d"))
-            elif field.type_ == datetime.time:
-                as_dict[field_name] = int(
-                    getattr(self, field_name).strftime("%H%M%S%f")
-                )
+            if value is None or encode is None:
+                as_dict[field_name] = value
             else:
-                as_dict[field_name] = ujson.loads(self.json(include={field_name}))[
-                    field_name
-                ]
+                as_dict[field_name] = encode(value)
+        if self.key and "key" not in exclude and include is None:
+            as_dict["key"] = self.key
         return as_dict
 
     # overwriting odetam's implementation
     @classmethod
-    def _deserialize(cls, data):
+    def _deserialize(cls, data, trusted=False):
+        if not instrumentation.hooks:
+            return cls._build(cls._decode(data), trusted, data)
+        started = time.perf_counter()
+        item = cls._build(cls._decode(data), trusted, data)
+        instrumentation.emit(
+            cls.__name__, "deserialize", 1, instrumentation.payload_size(data),
+            started)
+        return item
+
+    @classmethod
+    def _build(cls, values, trusted=False, record=None):
+        """Model object of decoded values. Trusted values, written by the model
+        itself, skip validation; their nested models are built the same way.
+        `record` is the raw record the values were decoded from."""
+        if trusted:
+            item = cls.construct(**_construct_nested(cls.__constructors__, values))
+        else:
+            item = cls.parse_obj(values)
+        item._stored = True
+        if record is not None:
+            item._remember(record)
+        return item
+
+    @classmethod
+    def _trusted(cls, trusted=None):
+        """Whether reads skip validation: per call, or else `Config.trusted_reads`"""
+        if trusted is None:
+            return getattr(cls.Config, "trusted_reads", False)
+        return trusted
+
+    @classmethod
+    def _decode(cls, data):
+        """Convert a raw Deta record into python values, without validation"""
         as_dict = {}
-        for field_name, field in cls.__fields__.items():
+        for field_name, decode, missing in cls.__deserializers__:
             # this originally failed when 0, 0.0, or False. Now we only check for None instances
             if field_name not in data:
-                as_dict[field_name] = field.type_()
-            elif field.type_ in DETA_TYPES:
-                as_dict[field_name] = data[field_name]
-            elif field.type_ == datetime.datetime:
-                as_dict[field_name] = datetime.datetime.fromtimestamp(data[field_name])
-            elif field.type_ == datetime.date:
-                as_dict[field_name] = datetime.datetime.strptime(
-                    str(data[field_name]), "%Y%m%d"
-                ).date()
-            elif field.type_ == datetime.time:
-                as_dict[field_name] = datetime.datetime.strptime(
-                    str(data[field_name]), "%H%M%S%f"
-                ).time()
+                as_dict[field_name] = missing()
+                continue
+            value = data[field_name]
+            if value is None or decode is None:
+                as_dict[field_name] = value
             else:
-                try:
-                    as_dict[field_name] = ujson.loads(data.get(field_name))
-                except (TypeError, ValueError):
-                    as_dict[field_name] = data.get(field_name, None)
-        return cls.parse_obj(as_dict)
+                as_dict[field_name] = decode(value)
+        return as_dict
+
+    @classmethod
+    def _reader(cls, fields=None, output="model", trusted=None):
+        """Function turning a raw record into the requested output, see
+        `DetaModel.get_all`"""
+        if fields is None and output == "model":
+            if cls._trusted(trusted):
+                return functools.partial(cls._deserialize, trusted=True)
+            return cls._deserialize
+        reader_key = (None if fields is None else tuple(fields), output)
+        reader = cls._readers.get(reader_key)
+        if reader is None:
+            reader = cls._readers[reader_key] = _compile_reader(cls, fields, output)
+        return reader
 
     @classmethod
-    def _return_item_or_raise(cls, item):
+    def _return_item_or_raise(cls, item, trusted=False):
         if item is None or item.get("key") == "None":
             raise ItemNotFound("Could not find item matching that key")
         try:
-            return cls._deserialize(item)
+            return cls._deserialize(item, trusted)
         except ValidationError:
             raise ItemNotFound("Could not find item matching that key")
 
@@ -157,81 +722,788 @@ class DetaModel(BaseDetaModel, metaclass=DetaModelMetaClass):
         self.key = self.key or None
 
     @classmethod
-    def get(cls, key):
+    def get(cls, key, trusted: Optional[bool] = None):
         """
         Get a single instance
         :param key: Deta database key
+        :param trusted: Build the object without validating the stored data,
+            much faster for data the model wrote itself. Defaults to
+            `Config.trusted_reads`, or False; pass False to validate anyway,
+            e.g. while migrating data.
         :return: object found in database serialized into its pydantic object
 
         :raises ItemNotFound: No matching item was found
         """
-        item = cls.__db__.get(key)
-        return cls._return_item_or_raise(item)
+        item = cls._db_get(key)
+        return cls._return_item_or_raise(item, cls._trusted(trusted))
+
+    @classmethod
+    def _db_get(cls, key):
+        if cls._write_behind is not None:
+            queued = cls._write_behind.pending(key)
+            if queued is not None:
+                return dict(queued)
+        fetch = functools.partial(cls.__db__.get, key)
+        if cls._cache is None:
+            return cls._coalesce(("get", key), fetch)
+        cached = cls._cache.get(key)
+        if cached is not None:
+            return ujson.loads(cached)
+        generation = cls._cache.generation()
+        item = cls._coalesce(("get", key), fetch)
+        if item is not None:
+            cls._cache.set(key, ujson.dumps(item))
+            # writes bump the generation before changing entries: one during
+            # the fetch may have deleted or replaced the record fetched
+            if cls._cache.generation() != generation:
+                cls._cache.delete(key)
+        return item
+
+    @classmethod
+    def get_many(cls, keys, concurrency: int = DEFAULT_CONCURRENCY,
+                 ordered: bool = False, missing: str = "skip",
+                 trusted: Optional[bool] = None):
+        """
+        Get several instances at once. Each distinct key is fetched once, with
+        up to `concurrency` requests in flight.
+        :param keys: Deta database keys, duplicates allowed
+        :param ordered: return a list following the order of `keys` instead of
+            a dict of key to object
+        :param missing: what to do with keys that are not found: 'raise'
+            ItemNotFound, 'skip' them, or put 'none' in their place
+        :param trusted: see `get`
+        :return: dict or list of objects found in database serialized into
+            their pydantic objects
+
+        :raises ItemNotFound: A key was not found and `missing` is 'raise'
+        """
+        if missing not in MISSING_POLICIES:
+            raise ValueError(f"missing must be one of {MISSING_POLICIES}")
+        unique = list(dict.fromkeys(keys))
+        found = {}
+        get = functools.partial(cls.get, trusted=trusted)
+        for key, result in zip(unique, cls._run_batches(get, unique, concurrency)):
+            if isinstance(result, ItemNotFound):
+                if missing == "raise":
+                    raise result
+                if missing == "none":
+                    found[key] = None
+            elif isinstance(result, BaseException):
+                raise result
+            else:
+                found[key] = result
+        if ordered:
+            return [found[key] for key in keys if key in found]
+        return found
 
     @classmethod
-    def get_all(cls):
-        """Get all the records from the database"""
-        records = cls.__db__.fetch().items
-        return [cls._deserialize(record) for record in records]
+    def get_all(cls, page_size: Optional[int] = None, limit: Optional[int] = None,
+                fields: Optional[List[str]] = None, output: str = "model",
+                trusted: Optional[bool] = None, prefetch: Optional[List[str]] = None):
+        """Get all the records from the database, following every page
+
+        :param fields: Only convert these fields, for lists that show a few
+            columns. Deta still sends whole records; the other fields are
+            skipped, neither converted nor validated.
+        :param output: 'model' for model objects, 'dict' or 'tuple' for plain
+            values, 'record' for a `RecordSet` of compact read-only rows (see
+            detamvc/records.py). Models read with `fields` are partial:
+            unrequested fields are None, and they can be changed through
+            `update` but not saved. Dicts, models and rows always carry the
+            key; tuples hold the `fields` in order, or every field.
+        :param trusted: Skip validating whole models, see `get`
+        :param prefetch: `Ref` fields whose records are fetched for every row
+            in one batch per referenced model, read with `related`. Needs model
+            output. See detamvc/relations.py.
+        """
+        read = cls._reader(fields, output, trusted)
+        records = cls._query_records(None, page_size, limit)
+        items = [read(record) for record in records]
+        return cls._collect(cls._attach_related(items, prefetch, fields, output), output)
 
     @classmethod
     def query(
-        cls, query_statement: Union[dict, DetaQuery, DetaQueryStatement, DetaQueryList]
+        cls,
+        query_statement: Union[dict, DetaQuery, DetaQueryStatement, DetaQueryList],
+        page_size: Optional[int] = None,
+        limit: Optional[int] = None,
+        fields: Optional[List[str]] = None,
+        output: str = "model",
+        trusted: Optional[bool] = None,
+        prefetch: Optional[List[str]] = None,
     ):
-        """Get items from database based on the query."""
-        if any(isinstance(query_statement, d) 
-                          for d in [DetaQuery, DetaQueryStatement, DetaQueryList]):
-            query_statement = query_statement.as_query()
-        found = cls.__db__.fetch(query_statement).items
-        return [cls._deserialize(item) for item in found]
+        """Get items from database based on the query.
+
+        See `get_all` for the meaning of `fields`, `output`, `trusted` and
+        `prefetch`.
+        """
+        read = cls._reader(fields, output, trusted)
+        query = cls._as_query(query_statement)
+        records = cls._query_records(query, page_size, limit)
+        items = [read(record) for record in records]
+        return cls._collect(cls._attach_related(items, prefetch, fields, output), output)
+
+    @classmethod
+    def _query_records(cls, query, page_size, limit):
+        """All the raw records matching the query, through the query cache"""
+        def fetch():
+            return list(cls._fetch_records(query, page_size, limit))
+
+        normalized = normalize_query(query)
+        if cls._query_cache is None:
+            return cls._coalesce(("query", limit, normalized), fetch)
+        # read the generation first: a write during the fetch leaves this entry
+        # under an outdated generation, where it is never served
+        cache_key = f"{cls._query_cache.generation()}:{limit}:{normalized}"
+        cached = cls._query_cache.get(cache_key)
+        if cached is not None:
+            return ujson.loads(cached)
+        records = cls._coalesce(("query", limit, normalized), fetch)
+        cls._query_cache.set(cache_key, ujson.dumps(records))
+        return records
+
+    @classmethod
+    def get_page(
+        cls,
+        query_statement: Union[dict, DetaQuery, DetaQueryStatement, DetaQueryList,
+                               None] = None,
+        limit: int = DEFAULT_PAGE_LIMIT,
+        last: Optional[str] = None,
+        fields: Optional[List[str]] = None,
+        output: str = "model",
+        trusted: Optional[bool] = None,
+        prefetch: Optional[List[str]] = None,
+    ):
+        """Get one page of items, for keyset pagination.
+
+        :param query_statement: Optional query, all items when omitted
+        :param limit: Number of items on the page
+        :param last: Cursor returned with the previous page, None for the first
+        :param fields: See `get_all`
+        :param output: See `get_all`
+        :param trusted: See `get_all`
+        :param prefetch: See `get_all`
+        :return: `(items, next_cursor)`, where `next_cursor` is None on the last page
+        """
+        read = cls._reader(fields, output, trusted)
+        query = cls._as_query(query_statement) if query_statement else None
+        records = []
+        # filtered fetches can return short pages, so keep following the cursor
+        while len(records) < limit:
+            response = cls.__db__.fetch(query, limit=limit - len(records), last=last)
+            records.extend(response.items)
+            last = response.last
+            if not last:
+                break
+        items = cls._attach_related([read(record) for record in records], prefetch, fields,
+                                    output)
+        return cls._collect(items, output), last
+
+    @classmethod
+    def to_columns(
+        cls,
+        query_statement: Union[dict, DetaQuery, DetaQueryStatement, DetaQueryList,
+                               None] = None,
+        fields: Optional[List[str]] = None,
+        page_size: Optional[int] = None,
+        limit: Optional[int] = None,
+    ):
+        """Load the matching records, or all of them, into one numpy array per
+        field, without building model objects. Needs numpy; see
+        detamvc/extras/columns.py for the column types and the aggregates.
+
+        :return: `Columns`, a dict of field name to array
+        """
+        from detamvc.extras.columns import to_columns
+
+        query = cls._as_query(query_statement) if query_statement else None
+        return to_columns(cls, cls._fetch_pages(query, page_size, limit), fields)
+
+    @classmethod
+    def _collect(cls, items, output):
+        return RecordSet(cls, items) if output == "record" else items
+
+    @classmethod
+    def iter_all(cls, page_size: Optional[int] = None, limit: Optional[int] = None,
+                 fields: Optional[List[str]] = None, output: str = "model",
+                 trusted: Optional[bool] = None, prefetch: Optional[List[str]] = None):
+        """Lazily iterate over all the records in the database.
+
+        Pages are fetched from Deta only as the previous one is consumed, and each
+        record is deserialized when it is reached.
+
+        :param page_size: Number of records requested per round trip. Defaults to
+            `Config.page_size`, or 1000 (the Deta maximum).
+        :param limit: Stop after this many records. Defaults to no limit.
+        :param fields: See `get_all`
+        :param output: See `get_all`
+        :param trusted: See `get_all`
+        :param prefetch: See `get_all`. References are resolved page by page.
+        """
+        read = cls._reader(fields, output, trusted)
+        if prefetch:
+            for page in cls._fetch_pages(None, page_size, limit):
+                yield from cls._attach_related(
+                    [read(record) for record in page], prefetch, fields, output)
+            return
+        for record in cls._fetch_records(None, page_size, limit):
+            yield read(record)
+
+    @classmethod
+    def iter_query(
+        cls,
+        query_statement: Union[dict, DetaQuery, DetaQueryStatement, DetaQueryList],
+        page_size: Optional[int] = None,
+        limit: Optional[int] = None,
+        fields: Optional[List[str]] = None,
+        output: str = "model",
+        trusted: Optional[bool] = None,
+        prefetch: Optional[List[str]] = None,
+    ):
+        """Lazily iterate over the items matching the query.
+
+        See `iter_all` for the meaning of the other arguments.
+        """
+        read = cls._reader(fields, output, trusted)
+        query = cls._as_query(query_statement)
+        if prefetch:
+            for page in cls._fetch_pages(query, page_size, limit):
+                yield from cls._attach_related(
+                    [read(record) for record in page], prefetch, fields, output)
+            return
+        for record in cls._fetch_records(query, page_size, limit):
+            yield read(record)
+
+    @staticmethod
+    def _as_query(query_statement):
+        if isinstance(query_statement, (DetaQuery, DetaQueryStatement, DetaQueryList)):
+            return query_statement.as_query()
+        return query_statement
+
+    @classmethod
+    def _fetch_records(cls, query=None, page_size=None, limit=None):
+        """Yield raw records page by page, following the Deta `last` cursor."""
+        for page in cls._fetch_pages(query, page_size, limit):
+            yield from page
+
+    @classmethod
+    def _fetch_pages(cls, query=None, page_size=None, limit=None):
+        """Yield lists of raw records, one per fetch request."""
+        keys = cls._index_lookup(query)
+        if keys is not None:
+            yield cls._indexed_records(query, keys, limit)
+            return
+        page_size = page_size or getattr(cls.Config, "page_size", DEFAULT_PAGE_SIZE)
+        if cls._sharded is not None:
+            yield from cls._sharded.pages(query, page_size, limit)
+            return
+        remaining = limit
+        last = None
+        while remaining is None or remaining > 0:
+            size = page_size if remaining is None else min(page_size, remaining)
+            response = cls.__db__.fetch(query, limit=size, last=last)
+            yield response.items
+            if remaining is not None:
+                remaining -= len(response.items)
+            last = response.last
+            if not last:
+                break
 
     @classmethod
     def delete_key(cls, key):
         """Delete an item based on the key"""
+        if cls._write_behind is not None:
+            cls._write_behind.discard([key])
         cls.__db__.delete(key)
+        cls._cache_forget(key)
+        cls._unindex(key)
+
+    @classmethod
+    def delete_many(cls, keys, concurrency: int = DEFAULT_CONCURRENCY, retries: int = 0,
+                    backoff: float = 0.5) -> int:
+        """Delete several keys, with up to `concurrency` deletes in flight.
+
+        :param keys: Deta database keys, duplicates allowed
+        :param retries: Number of times a failed delete is tried again
+        :param backoff: Seconds to wait before the first retry, doubled after each
+        :returns: Number of distinct keys deleted
+
+        :raises BatchError: Some deletes failed. Every key is still attempted;
+            the deleted keys are on `processed`.
+        """
+        unique = list(dict.fromkeys(keys))
+        results = cls._run_batches(cls.delete_key, unique, concurrency, retries, backoff)
+        failures = [
+            BatchFailure(index, [key], result)
+            for index, (key, result) in enumerate(zip(unique, results))
+            if isinstance(result, BaseException)
+        ]
+        if failures:
+            failed = {failure.index for failure in failures}
+            processed = [key for i, key in enumerate(unique) if i not in failed]
+            raise BatchError(
+                f"{len(failures)} of {len(unique)} deletes failed", processed, failures)
+        return len(unique)
+
+    @classmethod
+    def delete_where(
+        cls,
+        query_statement: Union[dict, DetaQuery, DetaQueryStatement, DetaQueryList],
+        concurrency: int = DEFAULT_CONCURRENCY,
+        dry_run: bool = False,
+        progress=None,
+        page_size: Optional[int] = None,
+    ) -> int:
+        """Delete every item matching the query, page by page. An empty query
+        matches every item.
+
+        :param concurrency: Number of deletes in flight
+        :param dry_run: Only count the matching items
+        :param progress: Called as `progress(matched, deleted)` after each page
+        :param page_size: See `iter_all`
+        :returns: Number of items deleted, or matched on a dry run
+
+        :raises BatchError: Some deletes of a page failed; the pages before it
+            were deleted, the ones after it were not attempted.
+        """
+        # queued saves must be stored to be found
+        cls.flush_writes()
+        query = cls._as_query(query_statement)
+        matched = deleted = 0
+        for page in cls._fetch_pages(query, page_size):
+            keys = [record["key"] for record in page]
+            matched += len(keys)
+            if not dry_run:
+                deleted += cls.delete_many(keys, concurrency)
+            if progress is not None:
+                progress(matched, deleted)
+        return matched if dry_run else deleted
 
     @classmethod
-    def put_many(cls, items):
+    def put_many(cls, items, concurrency: int = 1, retries: int = 0,
+                 backoff: float = 0.5):
         """Put multiple instances at once
 
+        Items are serialized up front and sent in chunks of 25, the most Deta
+        accepts per request.
+
         :param items: List of pydantic objects to put in the database
+        :param concurrency: Number of chunks sent at the same time
+        :param retries: Number of times a failed chunk is sent again
+        :param backoff: Seconds to wait before the first retry, doubled after each
         :returns: List of items successfully added, serialized with pydantic
+
+        :raises BatchError: Some chunks failed. Every chunk is still attempted;
+            the items that were added are on `processed`.
         """
         records = []
-        processed = []
         for item in items:
             exclude = set()
             if item.key is None:
                 exclude = {"key"}
             # noinspection PyProtectedMember
             records.append(item._serialize(exclude=exclude))
-            if len(records) == 25:
-                result = cls.__db__.put_many(records)
+        if cls._write_behind is not None:
+            cls._write_behind.discard(r["key"] for r in records if "key" in r)
+        chunks = [
+            records[i:i + PUT_MANY_BATCH_SIZE]
+            for i in range(0, len(records), PUT_MANY_BATCH_SIZE)
+        ]
+        results = cls._run_batches(cls._db_put_many, chunks, concurrency, retries, backoff)
+        processed = []
+        failures = []
+        for index, (chunk, result) in enumerate(zip(chunks, results)):
+            if isinstance(result, BaseException):
+                failures.append(BatchFailure(index, chunk, result))
+            else:
                 processed.extend(result["processed"]["items"])
-                records = []
-        if records:
-            result = cls.__db__.put_many(records)
-            processed.extend(result["processed"]["items"])
-        return [cls._deserialize(rec) for rec in processed]
+        read = cls._reader()
+        processed = [read(rec) for rec in processed]
+        if failures:
+            raise BatchError(
+                f"{len(failures)} of {len(chunks)} chunks failed", processed, failures
+            )
+        return processed
+
+    @classmethod
+    def _db_put_many(cls, records):
+        result = cls.__db__.put_many(records)
+        cls._cache_store(result["processed"]["items"])
+        cls._reindex(result["processed"]["items"])
+        return result
 
     # overwriting odetam's 'save/put' implementation
     # to include extra arguments supported by Deta
     @classmethod
     def _db_put(cls, data, expire_in, expire_at):
-        return cls.__db__.put(data, expire_in=expire_in, expire_at=expire_at)
-    
+        saved = cls.__db__.put(data, expire_in=expire_in, expire_at=expire_at)
+        if expire_in is None and expire_at is None:
+            cls._cache_store([saved])
+        else:
+            # the cache would outlive an expiring record
+            cls._cache_forget(saved["key"])
+        cls._reindex([saved])
+        return saved
+
+    # SHARDING
+
+    @classmethod
+    def reshard(cls, concurrency: int = DEFAULT_CONCURRENCY, progress=None) -> int:
+        """Move the records still in the `Config.previous_shards` layout to the
+        `Config.shards` one, while the app keeps running. See
+        detamvc/sharding.py.
+
+        :param progress: Called as `progress(scanned, moved)` after each page
+        :returns: Number of records moved
+        """
+        if cls._sharded is None or cls._sharded.previous is None:
+            raise ValueError(
+                f"{cls.__name__} is not being resharded: set Config.previous_shards "
+                "to the shard count to move from")
+        # queued saves must be stored in the new layout first
+        cls.flush_writes()
+        return cls._sharded.move_all(concurrency, progress)
+
+    # RELATIONS
+
+    @classmethod
+    def _attach_related(cls, items, prefetch, fields, output):
+        """Prefetch the references of freshly read rows, if asked to"""
+        if not prefetch:
+            return items
+        if isinstance(prefetch, str):
+            prefetch = [prefetch]
+        if output != "model":
+            raise ValueError("prefetch needs output='model'")
+        missing = [name for name in prefetch if fields is not None and name not in fields]
+        if missing:
+            raise ValueError(f"prefetched fields must be read: add {', '.join(missing)} "
+                             "to fields")
+        cls.prefetch_related(items, prefetch)
+        return items
+
+    @classmethod
+    def prefetch_related(cls, objects: List, names: List[str]) -> None:
+        """Resolve the `Ref` fields `names` of every object, fetching each
+        referenced record once, with one `get_many` per referenced model. The
+        results are read with `related`."""
+        if isinstance(names, str):
+            names = [names]
+        plan = {}
+        for name in names:
+            if name not in cls.__refs__:
+                raise ValueError(f"{cls.__name__}.{name} is not a Ref field")
+            ref, many = cls.__refs__[name]
+            plan.setdefault(ref.target(), []).append((name, many))
+        for target, refs in plan.items():
+            keys = set()
+            for obj in objects:
+                for name, many in refs:
+                    value = getattr(obj, name)
+                    if value:
+                        keys.update(value if many else (value,))
+            found = target.get_many(keys) if keys else {}
+            for obj in objects:
+                for name, many in refs:
+                    value = getattr(obj, name)
+                    if many:
+                        obj._related[name] = [found[key] for key in value or () if key in found]
+                    else:
+                        obj._related[name] = found.get(value) if value else None
+
+    # INDEXES
+    # Every field listed in Config.indexes is kept in a companion Base,
+    # `__index_db__`. It holds one entry per field, value and record, keyed
+    # "<field>:<value digest>:<record key>" so an equality lookup is a single
+    # key prefix fetch, plus a "~<record key>" entry listing the entries of the
+    # record so they can be removed once stale.
+
+    @staticmethod
+    def _index_digest(value):
+        return hashlib.sha1(ujson.dumps(value, sort_keys=True).encode()).hexdigest()[:20]
+
+    @classmethod
+    def _index_entries(cls, record):
+        key = record["key"]
+        return {
+            f"{field}:{cls._index_digest(record.get(field))}:{key}"
+            for field in cls.__indexes__
+        }
+
+    @classmethod
+    def _reindex(cls, records, fresh=False):
+        """Bring the index entries of stored records up to date. `fresh` skips
+        looking up their previous entries."""
+        if not cls.__indexes__:
+            return
+        index_db = cls.__index_db__
+        stale, added = [], []
+        for record in records:
+            key = record["key"]
+            entries = cls._index_entries(record)
+            previous = None if fresh else index_db.get(f"~{key}")
+            old = set(previous["entries"]) if previous else set()
+            if entries == old:
+                continue
+            stale.extend(old - entries)
+            added.extend({"key": entry, "pk": key} for entry in entries - old)
+            added.append({"key": f"~{key}", "entries": sorted(entries)})
+        for entry in stale:
+            index_db.delete(entry)
+        for i in range(0, len(added), PUT_MANY_BATCH_SIZE):
+            index_db.put_many(added[i:i + PUT_MANY_BATCH_SIZE])
+
+    @classmethod
+    def _unindex(cls, key):
+        if not cls.__indexes__:
+            return
+        index_db = cls.__index_db__
+        previous = index_db.get(f"~{key}")
+        for entry in previous["entries"] if previous else ():
+            index_db.delete(entry)
+        index_db.delete(f"~{key}")
+
+    @classmethod
+    def _index_lookup(cls, query):
+        """Keys of the records an equality query can match according to an
+        index, or None when no index applies to the query"""
+        if not cls.__indexes__ or not isinstance(query, dict):
+            return None
+        if any("?" in condition for condition in query):
+            return None
+        field = next((f for f in cls.__indexes__ if f in query), None)
+        if field is None:
+            return None
+        prefix = f"{field}:{cls._index_digest(query[field])}:"
+        keys = []
+        last = None
+        while True:
+            response = cls.__index_db__.fetch({"key?pfx": prefix}, last=last)
+            keys.extend(entry["pk"] for entry in response.items)
+            last = response.last
+            if not last:
+                break
+        return sorted(keys)
+
+    @classmethod
+    def _indexed_records(cls, query, keys, limit=None):
+        """Fetch the records found through an index, keeping those that still
+        match every condition of the query. With a `limit`, keys are fetched a
+        few at a time, until enough records matched."""
+        records = []
+        step = len(keys) if limit is None else max(limit, DEFAULT_CONCURRENCY)
+        for start in range(0, len(keys), step or 1):
+            batch = keys[start:start + step]
+            for record in cls._run_batches(cls._db_get, batch, DEFAULT_CONCURRENCY):
+                if isinstance(record, BaseException):
+                    raise record
+                if record is not None and all(
+                    _lookup(record, field) == value for field, value in query.items()
+                ):
+                    records.append(record)
+            if limit is not None and len(records) >= limit:
+                break
+        return records if limit is None else records[:limit]
+
+    @classmethod
+    def rebuild_indexes(cls, concurrency: int = DEFAULT_CONCURRENCY) -> int:
+        """Drop every index entry and index the stored records again, e.g. after
+        adding a field to `Config.indexes`.
+
+        :returns: Number of records indexed
+        """
+        if not cls.__indexes__:
+            return 0
+        last = None
+        while True:
+            response = cls.__index_db__.fetch(last=last)
+            keys = [entry["key"] for entry in response.items]
+            cls._run_batches(lambda key: cls.__index_db__.delete(key), keys, concurrency)
+            last = response.last
+            if not last:
+                break
+        indexed = 0
+        for page in cls._fetch_pages():
+            cls._reindex(page, fresh=True)
+            indexed += len(page)
+        return indexed
+
+    # CACHE
+
+    @classmethod
+    def _cache_store(cls, records):
+        cls._cache_invalidate_queries()
+        if cls._cache is not None:
+            cls._cache.bump_generation()
+            for record in records:
+                cls._cache.set(record["key"], ujson.dumps(record))
+
+    @classmethod
+    def _cache_forget(cls, key):
+        cls._cache_invalidate_queries()
+        if cls._cache is not None:
+            cls._cache.bump_generation()
+            cls._cache.delete(key)
+
+    @classmethod
+    def _cache_invalidate_queries(cls):
+        if cls._query_cache is not None:
+            cls._query_cache.bump_generation()
+        if cls._single_flight is not None:
+            # reads after a write must not join a read started before it
+            cls._single_flight.bump()
+
+    # SINGLE-FLIGHT
+
+    @classmethod
+    def _coalesce(cls, key, fetch):
+        """Run a Base read, or wait for the identical one in flight and get a
+        copy of its result"""
+        if cls._single_flight is None:
+            return fetch()
+        return cls._single_flight.do(key, fetch)
+
+    @classmethod
+    async def _acoalesce(cls, key, fetch):
+        """Async `_coalesce`: tasks waiting for a read in flight hold no thread"""
+        if cls._single_flight is None:
+            return await fetch()
+        return await cls._single_flight.ado(key, fetch)
+
+    @classmethod
+    def single_flight_stats(cls) -> Optional[FlightStats]:
+        """Reads sent to the Base and reads that shared one in flight instead,
+        None when `Config.single_flight` is False"""
+        return cls._single_flight.stats if cls._single_flight is not None else None
+
+    @classmethod
+    def cache_stats(cls) -> Optional[CacheStats]:
+        """Hit, miss and eviction counters of the model cache, None when the
+        model has no cache"""
+        return cls._cache.stats if cls._cache is not None else None
+
+    @classmethod
+    def query_cache_stats(cls) -> Optional[CacheStats]:
+        """Hit, miss and eviction counters of the query cache, None when the
+        model has no query cache"""
+        return cls._query_cache.stats if cls._query_cache is not None else None
+
+    @classmethod
+    def clear_cache(cls):
+        """Drop every cached record and query result of the model"""
+        if cls._cache is not None:
+            cls._cache.clear()
+        if cls._query_cache is not None:
+            cls._query_cache.clear()
+
+    # WRITE-BEHIND
+    # With Config.write_behind, save() queues the record and a background
+    # thread sends the queue in put_many batches, see detamvc/write_behind.py.
+
+    @classmethod
+    def flush_writes(cls) -> int:
+        """Send the records queued by save() now. Returns how many were sent."""
+        return cls._write_behind.flush() if cls._write_behind is not None else 0
+
+    @classmethod
+    def write_behind_stats(cls) -> Optional[WriteBehindStats]:
+        """Counters of the write-behind buffer, None when the model has none"""
+        return cls._write_behind.stats if cls._write_behind is not None else None
+
     def save(self, expire_in: int or None = None, expire_at: int or None = None):
         """Saves the record to the database. Behaves as upsert, will create
-        if not present. Database key will then be set on the object."""
-        saved = self._db_put(self._serialize(), expire_in, expire_at)
-        self.key = saved["key"]
-
-    def update(self, data: dict):
-        """Updates the record in the database with the provided data."""
-        for k, v in data.items():
-            if k in self.__dict__:
+        if not present. Database key will then be set on the object.
+
+        With `Config.write_behind`, the record is queued and sent later,
+        unless it expires."""
+        if self._partial:
+            raise DetaError("Item was read with a projection, change it with update()")
+        buffer = self._write_behind
+        record = self._serialize()
+        if buffer is not None and expire_in is None and expire_at is None:
+            self.key = buffer.enqueue(record)
+        else:
+            if buffer is not None and self.key:
+                buffer.discard([self.key])
+            saved = self._db_put(record, expire_in, expire_at)
+            self.key = saved["key"]
+        self._stored = True
+        self._dirty.clear()
+        self._remember(record)
+
+    def update(self, data: Optional[dict] = None):
+        """Updates the record in the database with the provided data, along with
+        any field assigned since the record was loaded or saved.
+
+        Only the changed fields are sent, through a partial Deta update, so
+        writers changing different fields of a record do not overwrite each
+        other. Lists, dicts and nested models changed in place count as
+        changed. An object that was never loaded or saved is saved whole."""
+        for k, v in (data or {}).items():
+            # forms post every field, only the changed ones need sending
+            if k in self.__dict__ and self.__dict__[k] != v:
                 setattr(self, k, v)
-        self.save()
+        if not (self.key and self._stored):
+            self.save()
+            return
+        changed = self._dirty | self._changed_in_place()
+        if not changed:
+            return
+        updates = self._serialize(include=changed)
+        self._db_update(updates)
+        self._dirty.clear()
+        self._remember(updates, updates)
+
+    def related(self, name: str):
+        """The record referenced by the `Ref` field `name`, as prefetched by a
+        read, or else fetched now. None when unset or not found; a list of the
+        records found for a list of references."""
+        if name not in self._related:
+            self.__class__.prefetch_related([self], [name])
+        return self._related[name]
+
+    def increment(self, field: str, value: Union[int, float] = 1):
+        """Add `value` to a number field in the database without reading the
+        record first, so concurrent increments all count. The object gets the
+        value it had plus `value`; changes made elsewhere are not fetched."""
+        self._check_field(field)
+        self._db_update(
+            {field: self.__class__.__db__.util.increment(value)},
+            {field: (self.__dict__[field] or 0) + value})
+
+    def append(self, field: str, value):
+        """Append a value, or a list of values, to a list field in the database
+        without reading the record first. The object's list is extended the
+        same way; changes made elsewhere are not fetched."""
+        self._check_field(field)
+        values = value if isinstance(value, list) else [value]
+        encode = dict(self.__serializers__)[field]
+        encoded = values if encode is None else [encode(v) for v in values]
+        self._db_update(
+            {field: self.__class__.__db__.util.append(encoded)},
+            {field: list(self.__dict__[field] or []) + values})
+
+    def _check_field(self, field):
+        if field not in self.__fields__ or field == "key":
+            raise DetaError(f"{self.__class__.__name__} has no field '{field}'")
+        if not (self.key and self._stored):
+            raise DetaError("Item must be saved before it can be updated in place")
+
+    def _db_update(self, updates: dict, values: Optional[dict] = None):
+        """Send a partial update, then set `values` on the object"""
+        cls = self.__class__
+        if cls._write_behind is not None and cls._write_behind.pending(self.key):
+            # the record must be stored before it can be updated in place
+            cls._write_behind.flush()
+        cls.__db__.update(updates, self.key)
+        if values:
+            self.__dict__.update(values)
+            self._remember(self._encode(include=values), values)
+        # the cached copy misses the changes made by other writers
+        cls._cache_forget(self.key)
+        if any(field in updates for field in cls.__indexes__):
+            # the object may be partial or behind other writers: index the stored record
+            cls._reindex([cls.__db__.get(self.key)])
 
     def delete(self):
         """Delete the open object from the database. The object will still exist in
@@ -242,6 +1514,190 @@ class DetaModel(BaseDetaModel, metaclass=DetaModelMetaClass):
         self.delete_key(self.key)
         self.key = None
 
+    @classmethod
+    def reset_clients(cls):
+        """Drop the Base client of every thread, the pool threads included, so
+        the next calls open new ones, e.g. after changing the backend or the
+        local database path"""
+        cls._db = threading.local()
+
+    # BATCHES
+    # get_many, put_many, delete_many and the index reads run on a pool owned
+    # by the model, whose threads keep their Base connections from call to
+    # call. Config.batch_concurrency sets its size, which caps the concurrency
+    # of every call. It is not the async pool: an async call holding a thread
+    # of one can wait for the other.
+
+    @classmethod
+    def _get_batch_pool(cls):
+        if cls._batch_pool is None:
+            with _executor_lock:
+                if cls._batch_pool is None:
+                    cls._batch_pool = ThreadPoolExecutor(
+                        max_workers=getattr(
+                            cls.Config, "batch_concurrency", DEFAULT_CONCURRENCY),
+                        thread_name_prefix=f"detamvc-{cls.__db_name__}-batch")
+        return cls._batch_pool
+
+    @classmethod
+    def _run_batches(cls, fn, batches, concurrency=1, retries=0, backoff=0.5):
+        """`run_batches` on the model's batch pool"""
+        pool = cls._get_batch_pool() if concurrency > 1 and len(batches) > 1 else None
+        return run_batches(fn, batches, concurrency, retries, backoff, pool)
+
+    # ASYNC
+    # The async twins run the synchronous calls on a thread pool owned by the
+    # model, so they never block the event loop. Each pool thread holds its own
+    # Base connection; Config.async_concurrency sets the pool size.
+
+    @classmethod
+    def _get_executor(cls):
+        if cls._executor is None:
+            with _executor_lock:
+                if cls._executor is None:
+                    cls._executor = ThreadPoolExecutor(
+                        max_workers=getattr(
+                            cls.Config, "async_concurrency", DEFAULT_CONCURRENCY),
+                        thread_name_prefix=f"detamvc-{cls.__db_name__}")
+        return cls._executor
+
+    @classmethod
+    async def _run_async(cls, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            cls._get_executor(), functools.partial(fn, *args, **kwargs))
+
+    @classmethod
+    async def aget(cls, key, trusted: Optional[bool] = None):
+        """Async version of `get`"""
+        item = await cls._acoalesce(
+            ("get", key), functools.partial(cls._run_async, cls._db_get, key))
+        return cls._return_item_or_raise(item, cls._trusted(trusted))
+
+    @classmethod
+    async def aget_many(cls, keys, **kwargs):
+        """Async version of `get_many`"""
+        return await cls._run_async(cls.get_many, keys, **kwargs)
+
+    @classmethod
+    async def aget_all(cls, page_size: Optional[int] = None,
+                       limit: Optional[int] = None, fields: Optional[List[str]] = None,
+                       output: str = "model", trusted: Optional[bool] = None,
+                       prefetch: Optional[List[str]] = None):
+        """Async version of `get_all`"""
+        return await cls._aread(None, page_size, limit, fields, output, trusted, prefetch)
+
+    @classmethod
+    async def aquery(cls, query_statement, page_size: Optional[int] = None,
+                     limit: Optional[int] = None, fields: Optional[List[str]] = None,
+                     output: str = "model", trusted: Optional[bool] = None,
+                     prefetch: Optional[List[str]] = None):
+        """Async version of `query`"""
+        return await cls._aread(
+            cls._as_query(query_statement), page_size, limit, fields, output, trusted,
+            prefetch)
+
+    @classmethod
+    async def _aread(cls, query, page_size, limit, fields, output, trusted, prefetch):
+        read = cls._reader(fields, output, trusted)
+        records = await cls._acoalesce(
+            ("query", limit, normalize_query(query)),
+            functools.partial(cls._run_async, cls._query_records, query, page_size, limit))
+        return await cls._run_async(lambda: cls._collect(
+            cls._attach_related([read(record) for record in records], prefetch, fields,
+                                output),
+            output))
+
+    @classmethod
+    async def aget_page(cls, query_statement=None, limit: int = DEFAULT_PAGE_LIMIT,
+                        last: Optional[str] = None, **kwargs):
+        """Async version of `get_page`"""
+        return await cls._run_async(cls.get_page, query_statement, limit, last, **kwargs)
+
+    @classmethod
+    async def aiter_all(cls, page_size: Optional[int] = None,
+                        limit: Optional[int] = None, fields: Optional[List[str]] = None,
+                        output: str = "model", trusted: Optional[bool] = None,
+                        prefetch: Optional[List[str]] = None):
+        """Async version of `iter_all`: pages are fetched on the model's pool"""
+        read = cls._reader(fields, output, trusted)
+        async for item in cls._aiter_items(
+                None, page_size, limit, read, prefetch, fields, output):
+            yield item
+
+    @classmethod
+    async def aiter_query(cls, query_statement, page_size: Optional[int] = None,
+                          limit: Optional[int] = None, fields: Optional[List[str]] = None,
+                          output: str = "model", trusted: Optional[bool] = None,
+                          prefetch: Optional[List[str]] = None):
+        """Async version of `iter_query`: pages are fetched on the model's pool"""
+        read = cls._reader(fields, output, trusted)
+        query = cls._as_query(query_statement)
+        async for item in cls._aiter_items(
+                query, page_size, limit, read, prefetch, fields, output):
+            yield item
+
+    @classmethod
+    async def _aiter_items(cls, query, page_size, limit, read, prefetch, fields, output):
+        """Read records page by page; references of a page are resolved on the
+        model's pool"""
+        pages = cls._fetch_pages(query, page_size, limit)
+        while True:
+            page = await cls._run_async(next, pages, None)
+            if page is None:
+                break
+            if prefetch:
+                items = await cls._run_async(
+                    cls._attach_related, [read(record) for record in page], prefetch,
+                    fields, output)
+                for item in items:
+                    yield item
+                continue
+            for record in page:
+                yield read(record)
+
+    @classmethod
+    async def aput_many(cls, items, **kwargs):
+        """Async version of `put_many`"""
+        return await cls._run_async(cls.put_many, items, **kwargs)
+
+    @classmethod
+    async def adelete_key(cls, key):
+        """Async version of `delete_key`"""
+        await cls._run_async(cls.delete_key, key)
+
+    @classmethod
+    async def adelete_many(cls, keys, **kwargs):
+        """Async version of `delete_many`"""
+        return await cls._run_async(cls.delete_many, keys, **kwargs)
+
+    @classmethod
+    async def adelete_where(cls, query_statement, **kwargs):
+        """Async version of `delete_where`. A `progress` callback runs on the
+        model's pool."""
+        return await cls._run_async(cls.delete_where, query_statement, **kwargs)
+
+    async def asave(self, expire_in: int or None = None,
+                    expire_at: int or None = None):
+        """Async version of `save`"""
+        await self._run_async(self.save, expire_in, expire_at)
+
+    async def aupdate(self, data: Optional[dict] = None):
+        """Async version of `update`"""
+        await self._run_async(self.update, data)
+
+    async def aincrement(self, field: str, value: Union[int, float] = 1):
+        """Async version of `increment`"""
+        await self._run_async(self.increment, field, value)
+
+    async def aappend(self, field: str, value):
+        """Async version of `append`"""
+        await self._run_async(self.append, field, value)
+
+    async def adelete(self):
+        """Async version of `delete`"""
+        await self._run_async(self.delete)
+
     def get_attribute_value(self, index=1):
         d = self.__dict__
         return d[list(d.keys())[index]]
\ No newline at end of file
@@ -0,0 +1,167 @@
+"""Lazy, chainable queries: `Model.objects`.
+
+    User.objects.filter(username="ana").first()
+    User.objects.filter(User.age >= 18).limit(20).all()
+    Item.objects.filter({"price?lt": 10}, available=True).count()
+    User.objects.filter(username="ana").exists()
+
+Nothing is fetched until a result is asked for. `limit` is passed down to the
+Base fetches, which stop as soon as enough records came back; `first` and
+`exists` fetch at most one record, `count` builds no model object. Iterating
+fetches the next page only once the previous one is consumed. `prefetch`
+resolves `Ref` fields page by page, see detamvc/relations.py.
+
+`filter` takes dicts, odetam queries (`Model.field == value`, combined with
+`&` and `|`) and keyword arguments, where `price__gte=5` means `"price?gte"`.
+Filters are combined with AND; an OR query combined with a filter keeps one
+alternative per OR branch.
+"""
+from typing import List, Optional
+
+
+def _and(left, right):
+    """Both queries, in the Deta form: a dict, or a list of OR alternatives"""
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if isinstance(left, list) or isinstance(right, list):
+        lefts = left if isinstance(left, list) else [left]
+        rights = right if isinstance(right, list) else [right]
+        return [_and(a, b) for a in lefts for b in rights]
+    for condition, value in right.items():
+        if condition in left and left[condition] != value:
+            raise ValueError(
+                f"Conflicting filters on '{condition}': "
+                f"{left[condition]!r} and {value!r}")
+    return {**left, **right}
+
+
+class QuerySet:
+    """Query on a model, evaluated only when its results are read. Every
+    method returning a QuerySet returns a new one."""
+
+    def __init__(self, model, query=None, limit: Optional[int] = None,
+                 fields: Optional[List[str]] = None, output: str = "model",
+                 trusted: Optional[bool] = None, page_size: Optional[int] = None,
+                 prefetch: Optional[List[str]] = None):
+        self.model = model
+        self.query = query
+        self._limit = limit
+        self._fields = fields
+        self._output = output
+        self._trusted = trusted
+        self._page_size = page_size
+        self._prefetch = prefetch
+
+    def _clone(self, **changes) -> "QuerySet":
+        state = {
+            "query": self.query, "limit": self._limit, "fields": self._fields,
+            "output": self._output, "trusted": self._trusted,
+            "page_size": self._page_size, "prefetch": self._prefetch}
+        state.update(changes)
+        return QuerySet(self.model, **state)
+
+    def __repr__(self):
+        return f"<QuerySet {self.model.__name__} {self.query!r} limit={self._limit}>"
+
+    # BUILDING
+
+    def filter(self, query_statement=None, **conditions) -> "QuerySet":
+        """Narrow the query down, see the module docstring"""
+        query = self.query
+        if query_statement is not None:
+            query = _and(query, self.model._as_query(query_statement))
+        if conditions:
+            query = _and(query, {
+                name.replace("__", "?", 1) if "__" in name else name: value
+                for name, value in conditions.items()})
+        return self._clone(query=query)
+
+    def limit(self, count: int) -> "QuerySet":
+        """At most `count` results, fetched no further than needed"""
+        if count < 0:
+            raise ValueError("limit must not be negative")
+        if self._limit is not None:
+            count = min(count, self._limit)
+        return self._clone(limit=count)
+
+    def only(self, *fields: str, output: Optional[str] = None) -> "QuerySet":
+        """Convert these fields only; see `DetaModel.get_all` for `fields` and
+        `output`"""
+        return self._clone(
+            fields=list(fields) or None, output=output or self._output)
+
+    def options(self, output: Optional[str] = None, trusted: Optional[bool] = None,
+                page_size: Optional[int] = None) -> "QuerySet":
+        """Output form, trusted reads and page size, see `DetaModel.get_all`"""
+        return self._clone(
+            output=output or self._output,
+            trusted=self._trusted if trusted is None else trusted,
+            page_size=page_size or self._page_size)
+
+    def prefetch(self, *names: str) -> "QuerySet":
+        """Resolve these `Ref` fields of every row, see `DetaModel.get_all`"""
+        return self._clone(prefetch=[*(self._prefetch or ()), *names])
+
+    # READING
+
+    def _read(self):
+        return self.model._reader(self._fields, self._output, self._trusted)
+
+    def _related(self, items):
+        return self.model._attach_related(items, self._prefetch, self._fields, self._output)
+
+    def __iter__(self):
+        read = self._read()
+        if self._prefetch:
+            for page in self.model._fetch_pages(self.query, self._page_size, self._limit):
+                yield from self._related([read(record) for record in page])
+            return
+        for record in self.model._fetch_records(self.query, self._page_size, self._limit):
+            yield read(record)
+
+    def all(self):
+        """Every result, as `query` would return it. Goes through the query
+        cache and shares identical reads in flight."""
+        read = self._read()
+        records = self.model._query_records(self.query, self._page_size, self._limit)
+        return self.model._collect(
+            self._related([read(record) for record in records]), self._output)
+
+    def first(self):
+        """The first result, or None. Fetches and converts one record at most."""
+        if self._limit == 0:
+            return None
+        records = self.model._query_records(self.query, None, 1)
+        return self._related([self._read()(records[0])])[0] if records else None
+
+    def exists(self) -> bool:
+        """Whether anything matches. Fetches one record at most, converts none."""
+        if self._limit == 0:
+            return False
+        return bool(self.model._query_records(self.query, None, 1))
+
+    def count(self) -> int:
+        """Number of results, counted page by page without building objects"""
+        return sum(
+            len(page)
+            for page in self.model._fetch_pages(self.query, self._page_size, self._limit))
+
+    # ASYNC
+
+    async def aall(self):
+        """Async version of `all`"""
+        return await self.model._run_async(self.all)
+
+    async def afirst(self):
+        """Async version of `first`"""
+        return await self.model._run_async(self.first)
+
+    async def aexists(self) -> bool:
+        """Async version of `exists`"""
+        return await self.model._run_async(self.exists)
+
+    async def acount(self) -> int:
+        """Async version of `count`"""
+        return await self.model._run_async(self.count)
@@ -0,0 +1,104 @@
+"""Compact read-only rows for large result sets.
+
+Every DetaModel gets a `__record__` class: a slotted row holding the
+converted field values, with no `__dict__`, no validation and no pydantic
+bookkeeping. Reads return them with `output="record"`:
+
+    rows = Item.get_all(output="record")        # a RecordSet
+    rows.sort_by("price", reverse=True)[:10]
+    prices = rows.column("price")
+    item = rows[0].to_model()                    # full model, when needed
+"""
+from operator import attrgetter
+from typing import Callable, Iterable, List, Optional, Union
+
+
+class Record:
+    """Read-only row of a model. Subclasses are generated by `record_class`."""
+    __slots__ = ()
+    __model__ = None
+    _fields = ()
+
+    def __init__(self, *values):
+        for name, value in zip(self._fields, values):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{self.__class__.__name__} is read-only")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{self.__class__.__name__} is read-only")
+
+    def __eq__(self, other):
+        return type(other) is type(self) and self.as_tuple() == other.as_tuple()
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        values = ", ".join(f"{name}={getattr(self, name)!r}" for name in self._fields)
+        return f"{self.__class__.__name__}({values})"
+
+    def as_tuple(self) -> tuple:
+        return tuple(getattr(self, name) for name in self._fields)
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self._fields}
+
+    def to_model(self, trusted: Optional[bool] = None):
+        """Full model object of the row. See `DetaModel.get` for `trusted`."""
+        model = self.__model__
+        return model._build(self.as_dict(), model._trusted(trusted))
+
+
+def record_class(model) -> type:
+    """Build the slotted row class of a model: the key, then every field"""
+    fields = ("key",) + tuple(name for name in model.__fields__ if name != "key")
+    return type(f"{model.__name__}Record", (Record,), {
+        "__slots__": fields,
+        "__model__": model,
+        "_fields": fields,
+        "__module__": model.__module__,
+    })
+
+
+class RecordSet:
+    """Sequence of rows of one model, with column access and sorting"""
+    __slots__ = ("model", "_rows")
+
+    def __init__(self, model, rows: Iterable[Record] = ()):
+        self.model = model
+        self._rows = list(rows)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def __getitem__(self, index: Union[int, slice]):
+        if isinstance(index, slice):
+            return RecordSet(self.model, self._rows[index])
+        return self._rows[index]
+
+    def __eq__(self, other):
+        if isinstance(other, RecordSet):
+            return self._rows == other._rows
+        return self._rows == other
+
+    def __repr__(self):
+        return f"<RecordSet of {len(self._rows)} {self.model.__name__}>"
+
+    def column(self, name: str) -> list:
+        """Values of one field, in row order"""
+        return list(map(attrgetter(name), self._rows))
+
+    def sort_by(self, *names: str, key: Optional[Callable] = None,
+                reverse: bool = False) -> "RecordSet":
+        """New set sorted on the given fields, or with a `key` function of the row"""
+        return RecordSet(
+            self.model, sorted(self._rows, key=key or attrgetter(*names), reverse=reverse))
+
+    def to_models(self, trusted: Optional[bool] = None) -> List:
+        """Full model objects of every row"""
+        return [row.to_model(trusted) for row in self._rows]
@@ -0,0 +1,108 @@
+"""References between models, resolved in batches.
+
+    class Book(DetaModel):
+        title: str
+        author: Ref["Author"]                   # the key of an Author
+        reviewers: List[Ref["User"]] = []
+
+A reference is stored as the key of the other record. Assigning a model
+object through `parse_obj` stores its key. Reads take `prefetch` to resolve
+the references of a page of rows with one deduplicated `get_many` per
+referenced model, instead of one `get` per row:
+
+    books = Book.get_all(prefetch=["author"])
+    books[0].related("author")                  # an Author, None when missing
+    Book.objects.filter(title="Dune").prefetch("author", "reviewers").all()
+
+`related` fetches what was not prefetched. Rows referencing the same record
+share one object of it.
+
+`Ref["Author"]` finds the model by class name in a registry filled as models
+are declared, so the module declaring Author must be imported before the
+references are resolved; `Ref[Author]` needs no lookup. When models of
+different modules share a class name, name the one meant with its module,
+`Ref["shop.models.Author"]`.
+"""
+from typing import Dict, Union
+
+# models by "<module>.<qualified name>"; declaring one again replaces it
+_registry: Dict[str, type] = {}
+# qualified names of the models by class name
+_names: Dict[str, Dict[str, None]] = {}
+
+
+def _qualified(model: type) -> str:
+    return f"{model.__module__}.{model.__qualname__}"
+
+
+def register_model(model: type) -> None:
+    """Add a model to the registry, unless it copies a registered model under
+    its name and table, as FastAPI does for the `response_model` of a route"""
+    for base in model.__mro__[1:]:
+        if (
+            base.__name__ == model.__name__
+            and getattr(base, "__db_name__", None) == model.__db_name__
+            and _registry.get(_qualified(base)) is base
+        ):
+            return
+    qualified = _qualified(model)
+    _registry[qualified] = model
+    _names.setdefault(model.__name__, {})[qualified] = None
+
+
+def resolve_model(name: str) -> type:
+    """The model declared with this class name, or this module and class name"""
+    model = _registry.get(name)
+    if model is not None:
+        return model
+    found = list(_names.get(name, ()))
+    if not found:
+        raise ValueError(
+            f"No model named '{name}' is declared, import the module declaring it")
+    if len(found) > 1:
+        raise ValueError(
+            f"Several models are named '{name}': {', '.join(found)}. "
+            f"Reference the one meant as Ref[Model] or Ref[\"<module>.{name}\"]")
+    return _registry[found[0]]
+
+
+class Ref(str):
+    """Key of a record of another model, declared as `Ref[Model]` or
+    `Ref["Model"]`"""
+    __target__: Union[str, type, None] = None
+    _refs: Dict[Union[str, type], type] = {}
+
+    def __class_getitem__(cls, target):
+        ref = cls._refs.get(target)
+        if ref is None:
+            name = target if isinstance(target, str) else target.__name__
+            ref = cls._refs[target] = type(f"Ref[{name}]", (Ref,), {"__target__": target})
+        return ref
+
+    @classmethod
+    def target(cls) -> type:
+        """The referenced model"""
+        if cls.__target__ is None:
+            raise TypeError("Declare references as Ref[Model]")
+        if isinstance(cls.__target__, str):
+            return resolve_model(cls.__target__)
+        return cls.__target__
+
+    @classmethod
+    def __get_validators__(cls):
+        yield cls.validate
+
+    @classmethod
+    def __modify_schema__(cls, field_schema):
+        name = cls.__target__ if isinstance(cls.__target__, str) else cls.__target__.__name__
+        field_schema.update(type="string", description=f"Key of a {name}")
+
+    @classmethod
+    def validate(cls, value):
+        if hasattr(value, "__fields__"):
+            if not getattr(value, "key", None):
+                raise ValueError("save the referenced object first, it has no key")
+            return value.key
+        if not isinstance(value, str):
+            raise TypeError("a reference is a key or a model object")
+        return str(value)
@@ -0,0 +1,290 @@
+"""Horizontal sharding of a model over several Bases.
+
+    class Event(DetaModel):
+        name: str
+
+        class Config:
+            table_name = "event"
+            shards = 8                  # Bases event_0 to event_7
+
+A record lives in the Base `<table_name>_<k>`, k being the CRC32 of its key
+modulo the shard count, so every read and write of a key goes to one Base.
+Keys of new records are made on the client, 12 hex characters, to know their
+shard before writing. Queries ask every shard at once and merge the records
+in key order, the order of one Base, as the pages come in: `get_all`,
+`query`, the iterators and `get_page` return what an unsharded model would.
+Secondary indexes stay in one Base.
+
+Resharding is done online:
+
+1. Set the new `shards` and set `previous_shards` to the old count (1 for a
+   model that was not sharded), and deploy. Writes go to the new layout and
+   drop the old copy, reads of a key fall back to the old layout, and
+   queries merge both.
+2. Run `detamvc reshard module:Model` to move the other records.
+3. Remove `previous_shards` and deploy.
+
+A delete that races the move of its record can be undone by the move.
+"""
+import heapq
+import secrets
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from operator import itemgetter
+from typing import Callable, Iterator, List, Optional, Union
+
+from detamvc.local_base import FetchResponse
+
+
+def shard_of(key: str, shards: int) -> int:
+    """Shard of a key, the same in every process"""
+    return zlib.crc32(key.encode()) % shards
+
+
+def new_key() -> str:
+    return secrets.token_hex(6)
+
+
+def layout(table: str, shards: int) -> List[str]:
+    """Base names of a table split in `shards`; one shard is the table itself"""
+    if shards <= 1:
+        return [table]
+    return [f"{table}_{k}" for k in range(shards)]
+
+
+class ShardedBase:
+    """Drop-in for a Base, spreading the records of one table over shards.
+
+    Args:
+        open_base (callable): returns the Base client of a name for the
+            calling thread.
+        table (str): table name of the model.
+        shards (int): number of shards.
+        previous_shards (int, optional): shard count being moved from.
+    """
+
+    def __init__(self, open_base: Callable, table: str, shards: int,
+                 previous_shards: Optional[int] = None):
+        self._open = open_base
+        self.table = table
+        self.names = layout(table, shards)
+        self.previous = layout(table, previous_shards) if previous_shards else None
+        # every Base holding records: both layouts while resharding
+        self.all_names = list(dict.fromkeys(self.names + (self.previous or [])))
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def __repr__(self):
+        return f"<ShardedBase {self.table} x{len(self.names)}>"
+
+    def home(self, key: str) -> str:
+        """Name of the Base a key belongs in"""
+        return self.names[shard_of(key, len(self.names))]
+
+    def _previous_home(self, key: str) -> Optional[str]:
+        if self.previous is None:
+            return None
+        name = self.previous[shard_of(key, len(self.previous))]
+        return None if name == self.home(key) else name
+
+    def _executor(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(
+                        max_workers=len(self.all_names),
+                        thread_name_prefix=f"detamvc-{self.table}-shards")
+        return self._pool
+
+    @property
+    def util(self):
+        return self._open(self.names[0]).util
+
+    # READS
+
+    def get(self, key: str) -> Optional[dict]:
+        item = self._open(self.home(key)).get(key)
+        previous = self._previous_home(key)
+        if item is None and previous is not None:
+            item = self._open(previous).get(key)
+        return item
+
+    def fetch(self, query: Union[dict, list, None] = None, limit: int = 1000,
+              last: Optional[str] = None) -> FetchResponse:
+        """One page of every shard, merged. The cursor only moves past keys
+        every shard has been read up to."""
+        responses = list(self._executor().map(
+            lambda name: self._open(name).fetch(query, limit=limit, last=last),
+            self.all_names))
+        bound = min((r.last for r in responses if r.last), default=None)
+        records = [
+            record
+            for record in self._merge(zip(self.all_names, (r.items for r in responses)))
+            if bound is None or record["key"] <= bound
+        ]
+        items = records[:limit]
+        if bound is None and len(records) <= limit:
+            return FetchResponse(len(items), None, items)
+        cursor = items[-1]["key"] if len(items) == limit else bound
+        return FetchResponse(len(items), cursor, items)
+
+    def pages(self, query=None, page_size: int = 1000,
+              limit: Optional[int] = None) -> Iterator[List[dict]]:
+        """Pages of the records of every shard, in key order. All the shards
+        are read at once, each fetching its next page while the previous is
+        merged."""
+        streams = [
+            (name, self._stream(name, query, page_size, limit)) for name in self.all_names]
+        page = []
+        count = 0
+        for record in self._merge(streams):
+            page.append(record)
+            count += 1
+            if len(page) == page_size:
+                yield page
+                page = []
+            if limit is not None and count >= limit:
+                break
+        if page:
+            yield page
+
+    def _stream(self, name, query, page_size, limit) -> Iterator[dict]:
+        """Records of one Base, each page fetched while the one before is read.
+        The first page is requested at once, not when the stream is first read."""
+        pool = self._executor()
+
+        def fetch(last, received):
+            size = page_size if limit is None else min(page_size, limit - received)
+            return self._open(name).fetch(query, limit=size, last=last)
+
+        def records(future):
+            received = 0
+            while future is not None:
+                response = future.result()
+                received += len(response.items)
+                more = response.last and (limit is None or received < limit)
+                future = pool.submit(fetch, response.last, received) if more else None
+                yield from response.items
+
+        return records(pool.submit(fetch, None, 0))
+
+    def _merge(self, streams) -> Iterator[dict]:
+        """Records of `(Base name, sorted records)` pairs in key order, once per
+        key: the copy in the key's home Base wins over one left by a reshard"""
+        def ranked(name, records):
+            for record in records:
+                key = record["key"]
+                yield key, 0 if self.home(key) == name else 1, record
+
+        last = None
+        merged = heapq.merge(
+            *(ranked(name, records) for name, records in streams), key=itemgetter(0, 1))
+        for key, _, record in merged:
+            if key != last:
+                last = key
+                yield record
+
+    # WRITES
+
+    def put(self, data, key: Optional[str] = None, expire_in: Optional[int] = None,
+            expire_at=None) -> dict:
+        data = dict(data)
+        key = key or data.get("key") or new_key()
+        data["key"] = key
+        saved = self._open(self.home(key)).put(
+            data, key, expire_in=expire_in, expire_at=expire_at)
+        self._drop_previous([key])
+        return saved
+
+    def insert(self, data, key: Optional[str] = None, expire_in: Optional[int] = None,
+               expire_at=None) -> dict:
+        key = key or data.get("key") or new_key()
+        previous = self._previous_home(key)
+        if previous is not None and self._open(previous).get(key) is not None:
+            raise Exception(f"Item with key '{key}' already exists")
+        return self._open(self.home(key)).insert(
+            data, key, expire_in=expire_in, expire_at=expire_at)
+
+    def put_many(self, items: List, expire_in: Optional[int] = None,
+                 expire_at=None) -> dict:
+        assert len(items) <= 25, "We can't put more than 25 items at a time."
+        groups = {}
+        keys = []
+        for item in items:
+            item = dict(item)
+            item["key"] = item.get("key") or new_key()
+            keys.append(item["key"])
+            groups.setdefault(self.home(item["key"]), []).append(item)
+        results = self._executor().map(
+            lambda group: self._open(group[0]).put_many(
+                group[1], expire_in=expire_in, expire_at=expire_at),
+            groups.items())
+        saved = {}
+        for result in results:
+            for item in result["processed"]["items"]:
+                saved[item["key"]] = item
+        self._drop_previous(keys)
+        return {"processed": {"items": [saved[key] for key in keys]}}
+
+    def update(self, updates: dict, key: str, expire_in: Optional[int] = None,
+               expire_at=None) -> None:
+        base = self._open(self.home(key))
+        if self._previous_home(key) is not None and base.get(key) is None:
+            self.move(key)
+        base.update(updates, key, expire_in=expire_in, expire_at=expire_at)
+
+    def delete(self, key: str) -> None:
+        self._open(self.home(key)).delete(key)
+        self._drop_previous([key])
+
+    def _drop_previous(self, keys) -> None:
+        for key in keys:
+            previous = self._previous_home(key)
+            if previous is not None:
+                self._open(previous).delete(key)
+
+    # RESHARDING
+
+    def move(self, key: str) -> bool:
+        """Move a record from its Base in the previous layout to its home.
+        Returns whether a record was moved."""
+        previous = self._previous_home(key)
+        if previous is None:
+            return False
+        record = self._open(previous).get(key)
+        if record is None:
+            return False
+        home = self._open(self.home(key))
+        try:
+            home.insert(record, key)
+        except Exception:
+            # a newer copy written meanwhile wins; anything else is an error
+            if home.get(key) is None:
+                raise
+        self._open(previous).delete(key)
+        return True
+
+    def move_all(self, concurrency: int = 8, progress: Optional[Callable] = None) -> int:
+        """Move every record left in the previous layout to its home, Base by
+        Base, calling `progress(scanned, moved)` after each page. Returns the
+        number of records moved."""
+        if self.previous is None:
+            raise ValueError("No previous layout to move records from")
+        scanned = moved = 0
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+            for name in self.previous:
+                last = None
+                while True:
+                    response = self._open(name).fetch(None, last=last)
+                    keys = [
+                        record["key"] for record in response.items
+                        if self.home(record["key"]) != name]
+                    scanned += len(response.items)
+                    moved += sum(pool.map(self.move, keys))
+                    if progress is not None:
+                        progress(scanned, moved)
+                    last = response.last
+                    if not last:
+                        break
+        return moved
@@ -13,13 +13,11 @@ class User(DetaModel):
 
     class Config:
         table_name = "{proj}_user"
+        indexes = ["username"]
 
     @classmethod
     def fetch_user(cls, username: str):
-        user = cls.query({{'username': username}})
-        if user:
-            return user[0]
-        return False
+        return cls.objects.filter(username=username).first()
 
     def signup(self):
         if User.fetch_user(self.username):
@@ -61,11 +59,9 @@ class User(DetaModel):
         request.session['user'].update(self.dict())
 
     def login(self, request: Request):
-        find_user = User.query({{'username': self.username}})
+        user = User.fetch_user(self.username)
         alert = Alert('Invalid Username or Password')
-        if find_user:
-            user = find_user[0]
-        else:
+        if user is None:
             return alert
         if not auth_handler.verify_password(self.password, user.password):
             return alert
@@ -81,7 +81,7 @@ def refresh_token(request: Request):
 
 @user_router.get('/username_available')
 def username_available(u: str):
-    return False if User.fetch_user(u) else True
+    return not User.objects.filter(username=u).exists()
 
 
 # GOOGLE OAUTH
@@ -1,6 +1,11 @@
+from os import environ
+
 from dotenv import load_dotenv
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
+from detamvc.instrumentation import enable_metrics
+from detamvc.metrics import metrics_router
+from detamvc.write_behind import flush_all
 
 from static_pages.router import static_pages_router
 
@@ -10,3 +15,15 @@ app = FastAPI(docs_url=None, redoc_url=None)
 app.mount("/static", StaticFiles(directory="static_pages/static"), name="static")
 
 app.include_router(static_pages_router, tags=["pages"], prefix="")
+
+
+@app.on_event("shutdown")
+def flush_write_behind():
+    # send what models with Config.write_behind still hold
+    flush_all()
+
+
+# set DETAMVC_METRICS=1 to time every Deta call and serve them at /metrics
+if environ.get("DETAMVC_METRICS"):
+    enable_metrics()
+    app.include_router(metrics_router, tags=["metrics"], prefix="")
@@ -1,8 +1,8 @@
-from detamvc.model import DetaModel
+from detamvc.model import {model_imports}
 
 
 class {Obj}(DetaModel):
     {model_attrs}
 
     class Config:
-        table_name = "{proj}_{obj}"
\ No newline at end of file
+        table_name = "{proj}_{obj}"{model_config}
\ No newline at end of file
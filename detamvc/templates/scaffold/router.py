@@ -1,4 +1,7 @@
-from fastapi import APIRouter, Request
+from typing import List
+from urllib.parse import urlencode
+
+from fastapi import APIRouter, Query, Request
 from fastapi.responses import RedirectResponse
 from fastapi.templating import Jinja2Templates
 
@@ -7,15 +10,36 @@ from {obj}.model import {Obj}
 
 {obj}_router = APIRouter()
 templates = Jinja2Templates(directory="")
+# cursors of earlier pages kept in the index URL; going back past the oldest
+# one returns to the first page
+PAGE_TRAIL = 10
 
 
 # INDEX
 @{obj}_router.get('/')
-def index(request: Request):
-    {obj}_list = {Obj}.get_all()
+def index(
+    request: Request, 
+    last: str = '', 
+    limit: int = Query(24, ge=1, le=1000), 
+    prev: List[str] = Query([])
+):
+    {obj}_list, next_cursor = {Obj}.get_page(
+        limit=limit, last=last or None, fields={index_fields}{index_prefetch})
+    # 'prev' holds the cursors of the last pages before this one, '' for the first
+    prev = prev[-PAGE_TRAIL:]
+    next_url = prev_url = None
+    if next_cursor:
+        trail = (prev + [last])[-PAGE_TRAIL:]
+        next_url = '?' + urlencode(
+            {{'last': next_cursor, 'limit': limit, 'prev': trail}}, doseq=True)
+    if last:
+        prev_url = '?' + urlencode(
+            {{'last': prev[-1] if prev else '', 'limit': limit, 'prev': prev[:-1]}}, 
+            doseq=True)
     return templates.TemplateResponse(
         '{obj}/templates/index.html',
-        context={{'request': request, '{obj}_list': {obj}_list }})
+        context={{'request': request, '{obj}_list': {obj}_list, 
+                 'next_url': next_url, 'prev_url': prev_url }})
 
 
 # CREATE
@@ -0,0 +1,91 @@
+from typing import List
+from urllib.parse import urlencode
+
+from fastapi import APIRouter, Query, Request
+from fastapi.responses import RedirectResponse
+from fastapi.templating import Jinja2Templates
+
+from {obj}.model import {Obj}
+
+
+{obj}_router = APIRouter()
+templates = Jinja2Templates(directory="")
+# cursors of earlier pages kept in the index URL; going back past the oldest
+# one returns to the first page
+PAGE_TRAIL = 10
+
+
+# INDEX
+@{obj}_router.get('/')
+async def index(
+    request: Request, 
+    last: str = '', 
+    limit: int = Query(24, ge=1, le=1000), 
+    prev: List[str] = Query([])
+):
+    {obj}_list, next_cursor = await {Obj}.aget_page(
+        limit=limit, last=last or None, fields={index_fields}{index_prefetch})
+    # 'prev' holds the cursors of the last pages before this one, '' for the first
+    prev = prev[-PAGE_TRAIL:]
+    next_url = prev_url = None
+    if next_cursor:
+        trail = (prev + [last])[-PAGE_TRAIL:]
+        next_url = '?' + urlencode(
+            {{'last': next_cursor, 'limit': limit, 'prev': trail}}, doseq=True)
+    if last:
+        prev_url = '?' + urlencode(
+            {{'last': prev[-1] if prev else '', 'limit': limit, 'prev': prev[:-1]}}, 
+            doseq=True)
+    return templates.TemplateResponse(
+        '{obj}/templates/index.html',
+        context={{'request': request, '{obj}_list': {obj}_list, 
+                 'next_url': next_url, 'prev_url': prev_url }})
+
+
+# CREATE
+@{obj}_router.get('/new')
+async def new(request: Request):
+    return templates.TemplateResponse(
+        '{obj}/templates/form.html',
+        context={{'request': request, 'vals': dict() }})
+
+
+@{obj}_router.post('/new', response_model={Obj})
+async def create(request: Request):
+    form_data = await request.form()
+    {obj} = {Obj}.parse_obj(form_data)
+    await {obj}.asave()
+    return RedirectResponse(f'/{obj}/{{{obj}.key}}', status_code=303)
+
+
+# UPDATE
+@{obj}_router.get('/edit/{{key}}')
+async def edit(request: Request, key: str):
+    vals = await {Obj}.aget(key)
+    return templates.TemplateResponse(
+        '{obj}/templates/form.html',
+        context={{'request': request, 'vals': vals.dict() }})
+
+
+@{obj}_router.post("/edit/{{key}}")
+async def update(request: Request, key: str):
+    in_db = await {Obj}.aget(key)
+    update_data = await request.form()
+    await in_db.aupdate(update_data)
+    return RedirectResponse(f'/{obj}/{{key}}', status_code=303)
+
+
+# DELETE
+@{obj}_router.get('/delete/{{key}}')
+async def delete(request: Request, key: str):
+    await {Obj}.adelete_key(key)
+    return RedirectResponse(f'/{obj}', status_code=303)
+
+
+# VIEW
+@{obj}_router.get('/{{key}}')
+async def view(request: Request, key: str):
+    {obj} = await {Obj}.aget(key)
+    return templates.TemplateResponse(
+        '{obj}/templates/view.html',
+        context={{'request': request, '{obj}': {obj} }})
\ No newline at end of file
@@ -1,6 +1,8 @@
 import json 
 from pathlib import Path
+import importlib
 import os
+import sys
 
 CONFIG_PATH = Path(__file__).parent.resolve() / 'user_config.json'
 
@@ -30,7 +32,10 @@ def valid_style(style: str):
     else:
         return None
 
-def run_server():
+def run_server(local: bool = False):
+    if local:
+        # inherited by the uvicorn process, see detamvc/local_base.py
+        os.environ["DETAMVC_BACKEND"] = "local"
     server_cmd = "uvicorn main:app --reload"
     if check_project_type() == "MKDOCS":
         server_cmd = "mkdocs serve"
@@ -43,3 +48,14 @@ def check_project_type():
             if 'mkdocs.yml' in fn:
                 project_type = "MKDOCS"
     return project_type
+
+def import_model(path: str):
+    """ import a model of the current project from 'module.path:ClassName' """
+    module_name, _, class_name = path.partition(':')
+    if not class_name:
+        raise ValueError(f"Expected 'module.path:ClassName', got '{path}'")
+    if os.getcwd() not in sys.path:
+        sys.path.insert(0, os.getcwd())
+    from dotenv import load_dotenv
+    load_dotenv(Path.cwd() / '.env')
+    return getattr(importlib.import_module(module_name), class_name)
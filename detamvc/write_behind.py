@@ -0,0 +1,177 @@
+"""Write-behind buffer for DetaModel.save().
+
+A model opts in through its Config:
+
+    class Event(DetaModel):
+        name: str
+
+        class Config:
+            write_behind = True
+            write_behind_batch = 25         # records per put_many, at most 25
+            write_behind_interval = 1.0     # seconds a record waits at most
+            write_behind_queue = 10000      # pending records before save() blocks
+
+`save()` then only serializes the record and queues it; a background thread
+sends the queue as `put_many` batches once a batch is full or the interval
+has passed. Saving a key that is still queued replaces the queued record, so
+it is sent once. The key of a new record is made on the client, so it is
+known at once.
+
+`get` sees queued records, queries only see them once flushed. Call
+`flush_all()` before the process exits; generated apps do it on shutdown, and
+it also runs at interpreter exit.
+"""
+import atexit
+import secrets
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+PUT_MANY_BATCH_SIZE = 25
+
+
+@dataclass
+class WriteBehindStats:
+    enqueued: int = 0
+    # saves that replaced a record still queued
+    coalesced: int = 0
+    flushed: int = 0
+    batches: int = 0
+    failed_batches: int = 0
+    # saves that had to wait for room in the queue
+    waits: int = 0
+
+
+class WriteBehindBuffer:
+    """Queue of serialized records of one model, flushed by a daemon thread.
+
+    Args:
+        send (callable): sends a list of batches of records, returning for each
+            the result or the exception raised, like `run_batches` in
+            detamvc/model.py.
+        batch (int): records per request.
+        interval (float): seconds before a partial batch is sent.
+        max_queue (int): queued records before `enqueue` blocks.
+    """
+
+    def __init__(self, send, batch: int = PUT_MANY_BATCH_SIZE,
+                 interval: float = 1.0, max_queue: int = 10_000):
+        self._send = send
+        self.batch = max(1, min(batch, PUT_MANY_BATCH_SIZE))
+        self.interval = interval
+        self.max_queue = max_queue
+        self.stats = WriteBehindStats()
+        self.last_error: Optional[BaseException] = None
+        self._pending = OrderedDict()
+        # records of the flush under way, still visible to `pending`
+        self._sending = {}
+        self._condition = threading.Condition()
+        # serializes flushes, so batches of one key go out in order
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        _buffers.add(self)
+
+    def __len__(self):
+        return len(self._pending)
+
+    def enqueue(self, record: dict) -> str:
+        """Queue a record, giving it a key when it has none. Blocks while the
+        queue is full. Returns the key."""
+        if not record.get("key"):
+            record["key"] = secrets.token_hex(6)
+        key = record["key"]
+        with self._condition:
+            if key in self._pending:
+                self.stats.coalesced += 1
+            else:
+                while len(self._pending) >= self.max_queue:
+                    self.stats.waits += 1
+                    self._condition.notify_all()
+                    self._condition.wait()
+            self._pending[key] = record
+            self.stats.enqueued += 1
+            if len(self._pending) >= self.batch:
+                self._condition.notify_all()
+        self._start()
+        return key
+
+    def pending(self, key: str) -> Optional[dict]:
+        """The queued record of `key`, if any"""
+        record = self._pending.get(key)
+        return record if record is not None else self._sending.get(key)
+
+    def discard(self, keys: Iterable[str]) -> None:
+        """Drop queued records, e.g. before they are deleted or written directly.
+        Waits for a flush under way, so it cannot land after that write."""
+        with self._flush_lock, self._condition:
+            for key in keys:
+                self._pending.pop(key, None)
+            self._condition.notify_all()
+
+    def flush(self) -> int:
+        """Send every queued record now. Returns how many were sent; records of
+        failed batches are queued again unless saved anew meanwhile."""
+        with self._flush_lock:
+            with self._condition:
+                self._sending = self._pending
+                self._pending = OrderedDict()
+                self._condition.notify_all()
+            records = list(self._sending.values())
+            chunks = [
+                records[i:i + self.batch] for i in range(0, len(records), self.batch)]
+            results = self._send(chunks) if chunks else ()
+            sent = 0
+            for chunk, result in zip(chunks, results):
+                if isinstance(result, BaseException):
+                    self.last_error = result
+                    self.stats.failed_batches += 1
+                    self._requeue(chunk)
+                    continue
+                sent += len(chunk)
+                self.stats.batches += 1
+            self._sending = {}
+            self.stats.flushed += sent
+            return sent
+
+    def _requeue(self, records):
+        with self._condition:
+            for record in records:
+                self._pending.setdefault(record["key"], record)
+
+    def _start(self):
+        if self._thread is None:
+            with self._condition:
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._run, name="detamvc-write-behind", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                deadline = time.monotonic() + self.interval
+                while len(self._pending) < self.batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+            if self._pending:
+                failures = self.stats.failed_batches
+                self.flush()
+                if self.stats.failed_batches > failures:
+                    # give the Base a rest before sending the requeued records again
+                    time.sleep(self.interval)
+
+
+_buffers = weakref.WeakSet()
+
+
+def flush_all() -> int:
+    """Flush the buffers of every model, e.g. on shutdown. Returns records sent."""
+    return sum(buffer.flush() for buffer in list(_buffers))
+
+
+atexit.register(flush_all)
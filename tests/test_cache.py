@@ -0,0 +1,52 @@
+import time
+
+from detamvc.cache import LRUCache, SharedMemoryCache, normalize_query
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache("items", size=2)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    assert cache.get("a") == "1"
+    cache.set("c", "3")
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert (cache.stats.hits, cache.stats.misses, cache.stats.evictions) == (2, 1, 1)
+
+
+def test_lru_expires_entries():
+    cache = LRUCache("items", size=2, ttl=0.01)
+    cache.set("a", "1")
+    time.sleep(0.02)
+    assert cache.get("a") is None
+
+
+def test_shared_cache_is_seen_by_other_instances(tmp_path):
+    path = tmp_path / "cache.sqlite3"
+    writer = SharedMemoryCache("items", size=2, path=path)
+    reader = SharedMemoryCache("items", size=2, path=path)
+    writer.set("a", "1")
+    assert reader.get("a") == "1"
+    writer.set("b", "2")
+    writer.set("c", "3")
+    assert reader.get("a") is None
+    assert writer.stats.evictions == 1
+    writer.delete("b")
+    assert reader.get("b") is None
+
+
+def test_normalize_query_ignores_condition_order():
+    assert normalize_query({"a": 1, "b?gt": 2}) == normalize_query({"b?gt": 2, "a": 1})
+    assert normalize_query([{"a": 1}, {"b": 2}]) == normalize_query([{"b": 2}, {"a": 1}])
+    assert normalize_query([{"a": 1}]) == normalize_query({"a": 1})
+    assert normalize_query({"a?r": [1, 2]}) != normalize_query({"a?r": [2, 1]})
+
+
+def test_generation_is_shared(tmp_path):
+    path = tmp_path / "cache.sqlite3"
+    writer = SharedMemoryCache("items:query_cache", size=2, path=path)
+    reader = SharedMemoryCache("items:query_cache", size=2, path=path)
+    assert reader.generation() == 0
+    writer.bump_generation()
+    writer.bump_generation()
+    assert reader.generation() == 2
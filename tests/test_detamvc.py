@@ -3,3 +3,13 @@ from detamvc import __version__
 
 def test_version():
     assert __version__ == '0.5.0'
+
+
+def test_benchmark_compare():
+    from detamvc.benchmarks import compare
+    previous = {"results": {"codec.encode": {"seconds": 2.0}, "app.view": {"p50_ms": 10}}}
+    current = {"results": {"codec.encode": {"seconds": 1.0}, "app.view": {"p50_ms": 15},
+                           "model.get_all": {"seconds": 1.0}}}
+    assert compare(previous, current) == [
+        ("codec.encode", "seconds", 2.0, 1.0, 0.5),
+        ("app.view", "p50_ms", 10, 15, 1.5)]
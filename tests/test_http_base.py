@@ -0,0 +1,57 @@
+import json
+
+import httpx
+
+from detamvc.http_base import HttpBase, Pool, PoolSettings, pool_settings
+
+
+def make_base(handler):
+    pool = Pool(PoolSettings(max_connections=2), transport=httpx.MockTransport(handler))
+    return HttpBase("items", "abc_secret", pool), pool
+
+
+def test_requests_follow_the_base_http_api():
+    sent = []
+
+    def handler(request):
+        body = json.loads(request.content) if request.content else None
+        sent.append((request.method, request.url.raw_path.decode(), body))
+        if request.method == "GET":
+            return httpx.Response(404)
+        if request.method == "POST":
+            return httpx.Response(200, json={"paging": {"size": 1, "last": "a"},
+                                             "items": [{"key": "a"}]})
+        if request.method == "PUT":
+            return httpx.Response(207, json={"processed": {"items": body["items"]}})
+        return httpx.Response(200, json={})
+
+    base, pool = make_base(handler)
+    assert base.get("a/b") is None
+    response = base.fetch({"n?gt": 1}, limit=5, last="0")
+    assert (response.count, response.last, response.items) == (1, "a", [{"key": "a"}])
+    assert base.put({"n": 1}, key="a")["key"] == "a"
+    base.update({"n": base.util.increment(2), "tags": base.util.append("x"),
+                 "old": base.util.trim(), "name": "b"}, "a")
+    base.delete("a")
+
+    assert sent == [
+        ("GET", "/v1/abc/items/items/a%2Fb", None),
+        ("POST", "/v1/abc/items/query", {"limit": 5, "last": "0", "query": [{"n?gt": 1}]}),
+        ("PUT", "/v1/abc/items/items", {"items": [{"n": 1, "key": "a"}]}),
+        ("PATCH", "/v1/abc/items/items/a", {
+            "set": {"name": "b"}, "increment": {"n": 2}, "append": {"tags": ["x"]},
+            "prepend": {}, "delete": ["old"]}),
+        ("DELETE", "/v1/abc/items/items/a", None),
+    ]
+    assert pool.stats.requests == 5 and pool.stats.in_flight == 0
+
+
+def test_pool_settings_from_config_and_environment(monkeypatch):
+    monkeypatch.setenv("DETAMVC_HTTP_MAX_CONNECTIONS", "50")
+    monkeypatch.setenv("DETAMVC_HTTP_READ_TIMEOUT", "2.5")
+
+    class Config:
+        http_max_connections = 5
+
+    assert pool_settings(Config) == PoolSettings(max_connections=5, read_timeout=2.5)
+    assert pool_settings().max_connections == 50
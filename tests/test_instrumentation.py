@@ -0,0 +1,120 @@
+import asyncio
+import subprocess
+import sys
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from detamvc import instrumentation
+from detamvc.instrumentation import Event, HistogramCollector, InstrumentedBase
+from detamvc.local_base import LocalDeta
+from detamvc.metrics import metrics_router
+
+
+@pytest.fixture
+def events():
+    received = []
+    hook = instrumentation.subscribe(received.append)
+    yield received
+    instrumentation.unsubscribe(hook)
+
+
+def test_base_calls_emit_one_event_each(tmp_path, events):
+    local = LocalDeta(tmp_path / "local.sqlite3").Base("items")
+    base = InstrumentedBase(local, "Item")
+    records = [{"key": "a", "n": 1}, {"key": "b", "n": 2}, {"key": "c", "n": 3}]
+    base.put(records[0])
+    base.put_many(records[1:])
+    base.get("a")
+    base.get("missing")
+    base.fetch({"n?gt": 1})
+    base.update({"n": 5}, "a")
+    base.delete("a")
+    local.close()
+
+    size = instrumentation.payload_size
+    assert [(e.model, e.operation, e.count, e.bytes) for e in events] == [
+        ("Item", "put", 1, size(records[0])),
+        ("Item", "put_many", 2, size(records[1:])),
+        ("Item", "get", 1, size(records[0])),
+        ("Item", "get", 0, 0),
+        ("Item", "fetch", 2, size(records[1:])),
+        ("Item", "update", 1, size({"n": 5})),
+        ("Item", "delete", 1, 0),
+    ]
+    assert all(e.duration >= 0 for e in events)
+
+
+def test_projected_reads_emit_deserialize(tmp_path, monkeypatch, events):
+    pytest.importorskip("deta")
+    from detamvc.model import DetaModel
+
+    class Metered(DetaModel):
+        name: str
+        price: float
+
+        class Config:
+            table_name = "test_metered"
+            backend = "local"
+
+    monkeypatch.setenv("DETAMVC_LOCAL_PATH", str(tmp_path / "local.sqlite3"))
+    Metered.put_many([Metered(key=str(i), name=f"m{i}", price=i) for i in range(3)])
+    for read in (
+        lambda: Metered.get_all(),
+        lambda: Metered.get_all(fields=["name"]),
+        lambda: Metered.get_all(output="dict"),
+        lambda: Metered.query({"price?lt": 5}, fields=["price"], output="tuple"),
+    ):
+        events.clear()
+        read()
+        assert [e.operation for e in events].count("deserialize") == 3
+
+
+def test_histogram_buckets_are_cumulative():
+    collector = HistogramCollector(buckets=(0.01, 0.1))
+    for duration in (0.005, 0.05, 0.05, 1.0):
+        collector(Event("Item", "get", 1, 10, duration))
+    lines = collector.prometheus_text().splitlines()
+    labels = 'model="Item",operation="get"'
+    for line in (
+        f'detamvc_operation_seconds_bucket{{{labels},le="0.01"}} 1',
+        f'detamvc_operation_seconds_bucket{{{labels},le="0.1"}} 3',
+        f'detamvc_operation_seconds_bucket{{{labels},le="+Inf"}} 4',
+        f'detamvc_operation_seconds_count{{{labels}}} 4',
+        f'detamvc_operation_items_total{{{labels}}} 4',
+        f'detamvc_operation_bytes_total{{{labels}}} 40',
+    ):
+        assert line in lines
+    collector.reset()
+    assert labels not in collector.prometheus_text()
+
+
+def test_metrics_route_serves_the_collector():
+    app = FastAPI()
+    app.include_router(metrics_router)
+    instrumentation.enable_metrics()
+    try:
+        instrumentation.emit("Item", "fetch", 5, 120, 0.0)
+
+        async def scrape():
+            async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+                return await client.get("/metrics")
+
+        response = asyncio.run(scrape())
+    finally:
+        instrumentation.unsubscribe(instrumentation.collector)
+        instrumentation.collector.reset()
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    labels = 'model="Item",operation="fetch"'
+    assert f'detamvc_operation_seconds_bucket{{{labels},le="+Inf"}} 1' in response.text
+    assert f'detamvc_operation_items_total{{{labels}}} 5' in response.text
+
+
+def test_model_layer_does_not_import_fastapi():
+    pytest.importorskip("deta")
+    code = (
+        "import sys, detamvc.model; "
+        "sys.exit(any(m.startswith(('fastapi', 'starlette')) for m in sys.modules))")
+    assert subprocess.run([sys.executable, "-c", code]).returncode == 0
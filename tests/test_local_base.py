@@ -0,0 +1,65 @@
+import time
+
+import pytest
+
+from detamvc.local_base import LocalDeta
+
+
+@pytest.fixture
+def base(tmp_path):
+    base = LocalDeta(tmp_path / "local.sqlite3").Base("items")
+    base.put_many([
+        {"key": f"{i:03d}", "name": f"item {i}", "price": i, "tags": ["even" if i % 2 == 0 else "odd"],
+         "owner": {"name": "ann" if i < 5 else "bob"}, "available": i % 3 == 0}
+        for i in range(10)])
+    yield base
+    base.close()
+
+
+def test_put_and_get(base):
+    saved = base.put({"name": "new"})
+    assert len(saved["key"]) == 12
+    assert base.get(saved["key"]) == saved
+    assert base.get("missing") is None
+
+
+def test_fetch_follows_the_last_cursor(base):
+    first = base.fetch(limit=4)
+    assert [i["key"] for i in first.items] == ["000", "001", "002", "003"]
+    assert first.last == "003"
+    rest = base.fetch(limit=10, last=first.last)
+    assert rest.count == 6 and rest.last is None
+
+
+@pytest.mark.parametrize("query, keys", [
+    ({"name": "item 3"}, ["003"]),
+    ({"price?gte": 8}, ["008", "009"]),
+    ({"price?r": [2, 3]}, ["002", "003"]),
+    ({"name?pfx": "item 1"}, ["001"]),
+    ({"tags?contains": "odd", "price?lt": 5}, ["001", "003"]),
+    ({"owner.name": "bob", "available": True}, ["006", "009"]),
+    ([{"price": 1}, {"price": 2}], ["001", "002"]),
+    ({"price?ne": 0, "price?lte": 1}, ["001"]),
+    ({"name?not_contains": "item"}, []),
+])
+def test_fetch_queries(base, query, keys):
+    assert [i["key"] for i in base.fetch(query).items] == keys
+
+
+def test_update_operations(base):
+    base.update({"price": base.util.increment(5), "tags": base.util.append("x"),
+                 "owner.name": "cid", "available": base.util.trim()}, "001")
+    item = base.get("001")
+    assert item["price"] == 6
+    assert item["tags"] == ["odd", "x"]
+    assert item["owner"] == {"name": "cid"}
+    assert "available" not in item
+    with pytest.raises(Exception):
+        base.update({"price": 1}, "missing")
+
+
+def test_expired_items_are_hidden(base):
+    base.put({"name": "short"}, "tmp", expire_at=int(time.time()) - 1)
+    assert base.get("tmp") is None
+    assert "tmp" not in [i["key"] for i in base.fetch().items]
+    assert base.purge_expired() == 1
@@ -0,0 +1,661 @@
+import asyncio
+import datetime
+import threading
+import time
+from typing import Dict, List, Optional
+
+import pytest
+import ujson
+from pydantic import BaseModel
+
+pytest.importorskip("deta")
+
+from detamvc.cache import SingleFlight  # noqa: E402
+from detamvc.local_base import LocalDeta  # noqa: E402
+from detamvc.model import BatchError, DetaError, DetaModel, ItemNotFound, Ref  # noqa: E402
+
+
+class Item(DetaModel):
+    name: str
+    price: float
+    released: datetime.date
+    opens: datetime.time
+
+    class Config:
+        table_name = "test_item"
+        backend = "local"
+
+
+class Tagged(DetaModel):
+    name: str
+    tag: str
+    labels: List[str] = []
+
+    class Config:
+        table_name = "test_tagged"
+        backend = "local"
+        indexes = ["tag"]
+
+
+class Event(DetaModel):
+    name: str
+
+    class Config:
+        table_name = "test_event"
+        backend = "local"
+        write_behind = True
+        write_behind_interval = 60
+
+
+class Author(DetaModel):
+    name: str
+
+    class Config:
+        table_name = "test_author"
+        backend = "local"
+
+
+class Book(DetaModel):
+    title: str
+    author: Ref["Author"]
+    editors: List[Ref[Author]] = []
+
+    class Config:
+        table_name = "test_book"
+        backend = "local"
+
+
+class Dim(BaseModel):
+    w: int
+    label: str
+
+
+class Box(DetaModel):
+    name: str
+    dim: Dim
+    parts: List[Dim] = []
+    by_side: Dict[str, Dim] = {}
+    lid: Optional[Dim] = None
+
+    class Config:
+        table_name = "test_box"
+        backend = "local"
+
+
+class Cached(DetaModel):
+    name: str
+    count: int = 0
+
+    class Config:
+        table_name = "test_cached"
+        backend = "local"
+        cache_size = 100
+        query_cache_size = 10
+
+
+@pytest.fixture(autouse=True)
+def local_db(tmp_path, monkeypatch):
+    monkeypatch.setenv("DETAMVC_LOCAL_PATH", str(tmp_path / "local.sqlite3"))
+    for model in (Item, Tagged, Event, Author, Book, Box, Cached):
+        model.reset_clients()
+        model.clear_cache()
+    yield
+
+
+def make_items(count):
+    return [
+        Item(key=f"{i:04d}", name=f"item {i}", price=i,
+             released=datetime.date(2023, 1, 1 + i % 28),
+             opens=datetime.time(9, 30, i % 60, 15))
+        for i in range(count)]
+
+
+def test_save_get_roundtrip():
+    item = make_items(1)[0]
+    item.key = None
+    item.save()
+    assert Item.get(item.key) == item
+    item.delete()
+    with pytest.raises(ItemNotFound):
+        Item.get("0000")
+
+
+def test_nested_models_store_like_json():
+    box = Box(key="b", name="box", dim=Dim(w=1, label="x"),
+              parts=[Dim(w=2, label="y"), Dim(w=3, label="z")],
+              by_side={"top": Dim(w=4, label="t")}, lid=Dim(w=5, label="l"))
+    record = box._serialize()
+    for field in ("dim", "parts", "by_side", "lid"):
+        assert record[field] == ujson.loads(box.json(include={field}))[field]
+    Box.put_many([box])
+    box.save()
+    assert Box.get("b") == box
+    box.update({"parts": [Dim(w=6, label="p")], "lid": None})
+    assert Box.get("b").parts == [Dim(w=6, label="p")] and Box.get("b").lid is None
+    # plain dicts assigned to a nested-model field are stored as they are
+    box.update({"dim": {"w": 2, "label": "u"}})
+    assert Box.get("b").dim == Dim(w=2, label="u")
+    box.dim = {"w": 3, "label": "s"}
+    box.save()
+    assert Box.get("b").dim == Dim(w=3, label="s")
+
+
+def test_get_all_follows_every_page():
+    Item.put_many(make_items(60), concurrency=4)
+    assert [i.key for i in Item.get_all(page_size=7)] == [f"{i:04d}" for i in range(60)]
+    assert len(Item.get_all(page_size=7, limit=10)) == 10
+    assert [i.price for i in Item.iter_query({"price?gte": 58}, page_size=1)] == [58, 59]
+
+
+def test_get_many():
+    Item.put_many(make_items(5))
+    found = Item.get_many(["0001", "0003", "0001", "nope"], ordered=True, missing="none")
+    assert [i and i.key for i in found] == ["0001", "0003", "0001", None]
+
+
+def test_put_many_retries_failed_chunks(monkeypatch):
+    put_many = Item._db_put_many
+    attempts = {}
+
+    def flaky(records, failing=2):
+        first = records[0]["key"]
+        attempts[first] = attempts.get(first, 0) + 1
+        if first == "0025" and attempts[first] <= failing:
+            raise ConnectionError("reset by peer")
+        return put_many(records)
+
+    monkeypatch.setattr(Item, "_db_put_many", flaky)
+    saved = Item.put_many(make_items(60), concurrency=3, retries=2, backoff=0)
+    assert len(saved) == 60 and attempts == {"0000": 1, "0025": 3, "0050": 1}
+
+    attempts.clear()
+    with pytest.raises(BatchError) as error:
+        Item.put_many(make_items(60), concurrency=3, retries=1, backoff=0)
+    assert [item.key for item in error.value.processed] == [
+        f"{i:04d}" for i in list(range(25)) + list(range(50, 60))]
+    [failure] = error.value.failures
+    assert (failure.index, len(failure.items), attempts["0025"]) == (1, 25, 2)
+    assert isinstance(failure.error, ConnectionError)
+    # the batches ran on the model's pool, kept for the next call
+    assert Item._batch_pool is not None and Item._get_batch_pool() is Item._batch_pool
+
+
+def test_record_cache_writes_through_and_evicts():
+    Cached(key="a", name="a").save()
+    Cached.put_many([Cached(key="b", name="b"), Cached(key="c", name="c")])
+    stats, flights = Cached.cache_stats(), Cached.single_flight_stats()
+    hits, misses, calls = stats.hits, stats.misses, flights.calls
+    # saved records are served from the cache, without a Base request
+    assert [Cached.get(key).name for key in "abc"] == ["a", "b", "c"]
+    assert (stats.hits - hits, stats.misses - misses, flights.calls) == (3, 0, calls)
+    Cached.__db__.update({"name": "changed elsewhere"}, "a")
+    assert Cached.get("a").name == "a"
+
+    Cached.get("b").update({"name": "b2"})
+    Cached.get("c").increment("count", 2)
+    Cached.delete_key("a")
+    hits, misses = stats.hits, stats.misses
+    assert Cached.get("b").name == "b2" and Cached.get("c").count == 2
+    with pytest.raises(ItemNotFound):
+        Cached.get("a")
+    assert (stats.hits - hits, stats.misses - misses) == (0, 3)
+    assert Cached.get("b").name == "b2" and stats.hits - hits == 1
+
+    # a delete landing between the fetch of a miss and its caching
+    base = Cached.__db__
+    fetch = base.get
+
+    def racing_get(key):
+        item = fetch(key)
+        Cached.delete_key(key)
+        return item
+
+    Cached.clear_cache()
+    base.get = racing_get
+    assert Cached.get("b").name == "b2"
+    base.get = fetch
+    with pytest.raises(ItemNotFound):
+        Cached.get("b")
+
+
+def test_query_cache_is_dropped_by_writes():
+    Cached.put_many([Cached(key="a", name="a"), Cached(key="b", name="b")])
+    stats = Cached.query_cache_stats()
+    assert [c.key for c in Cached.query({"count": 0})] == ["a", "b"]
+    Cached.__db__.put({"key": "z", "name": "z", "count": 0})
+    hits = stats.hits
+    assert [c.key for c in Cached.query({"count": 0})] == ["a", "b"]
+    assert stats.hits == hits + 1
+
+    generation = Cached._query_cache.generation()
+    Cached(key="c", name="c").save()
+    assert Cached._query_cache.generation() == generation + 1
+    assert [c.key for c in Cached.query({"count": 0})] == ["a", "b", "c", "z"]
+    Cached.get("a").increment("count")
+    assert [c.key for c in Cached.query({"count": 0})] == ["b", "c", "z"]
+
+
+def test_concurrent_reads_share_one_request():
+    Item.put_many(make_items(3))
+    stats = Item.single_flight_stats()
+    calls, coalesced = stats.calls, stats.coalesced
+
+    async def read():
+        return await asyncio.gather(
+            *[Item.aget("0001") for _ in range(4)],
+            *[Item.aquery({"price?lt": 2}) for _ in range(4)])
+
+    results = asyncio.run(read())
+    assert (stats.calls - calls, stats.coalesced - coalesced) == (2, 6)
+    assert results[:4] == [Item.get("0001")] * 4 and results[1] is not results[0]
+    assert [[i.key for i in found] for found in results[4:]] == [["0000", "0001"]] * 4
+
+    flight, release = SingleFlight(), threading.Event()
+
+    def fetch():
+        release.wait()
+        return {"tags": ["a"]}
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(flight.do("k", fetch)))
+        for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    while flight.stats.coalesced < 2:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert results == [{"tags": ["a"]}] * 3 and flight.stats.calls == 1
+    assert len({id(result["tags"]) for result in results}) == 3
+    # a write in between starts a new flight
+    flight.bump()
+    assert flight.do("k", lambda: 1) == 1 and flight.stats.calls == 2
+
+
+def test_query_sets():
+    Item.put_many(make_items(30))
+    cheap = Item.objects.filter({"price?lt": 20}).filter(name="item 3")
+    assert cheap.query == {"price?lt": 20, "name": "item 3"}
+    assert cheap.first().key == "0003" and cheap.exists() and cheap.count() == 1
+    assert not Item.objects.filter(price__gte=100).exists()
+    assert Item.objects.filter(Item.price < 5.0).count() == 5
+    either = Item.objects.filter((Item.name == "item 1") | (Item.name == "item 2"))
+    assert either.filter(price__gt=1).query == [
+        {"name": "item 1", "price?gt": 1}, {"name": "item 2", "price?gt": 1}]
+    assert [i.key for i in either.filter(price__gt=1)] == ["0002"]
+    assert len(Item.objects.limit(4).all()) == 4 and Item.objects.limit(0).first() is None
+    assert Item.objects.limit(25).limit(40).count() == 25
+    assert Item.objects.only("name", output="tuple").filter(price=7).all() == [("item 7",)]
+    with pytest.raises(ValueError):
+        Item.objects.filter(name="a").filter(name="b")
+
+    # one fetch of one record for first()
+    Item.reset_clients()
+    fetches = []
+    fetch = Item.__db__.fetch
+    Item.__db__.fetch = lambda *a, **kw: fetches.append(kw["limit"]) or fetch(*a, **kw)
+    assert Item.objects.first().key == "0000" and fetches == [1]
+
+    Tagged.put_many([Tagged(key=str(i), name=f"t{i}", tag="a") for i in range(20)])
+    assert Tagged.objects.filter(tag="a").first().key == "0"
+    assert Tagged.objects.filter(tag="a").limit(3).count() == 3
+    assert asyncio.run(Tagged.objects.filter(tag="b").aexists()) is False
+
+
+def test_prefetch_references():
+    authors = [Author(key=f"a{i}", name=f"author {i}") for i in range(3)]
+    Author.put_many(authors)
+    Book.put_many([
+        Book.parse_obj({"key": f"b{i}", "title": f"book {i}", "author": authors[i % 3],
+                        "editors": ["a0", "gone"]})
+        for i in range(9)] + [Book(key="b9", title="orphan", author="gone")])
+    assert Book.schema()["properties"]["author"]["type"] == "string"
+
+    gets = Author.single_flight_stats().calls
+    books = Book.get_all(prefetch=["author", "editors"])
+    # one get per distinct key, not one per row
+    assert Author.single_flight_stats().calls - gets == 4
+    assert [b.related("author").name for b in books[:4]] == [
+        "author 0", "author 1", "author 2", "author 0"]
+    assert books[0].related("author") is books[3].related("author")
+    assert books[0].related("editors") == [authors[0]] and books[9].related("author") is None
+
+    page, _ = Book.get_page(limit=2, fields=["author"], prefetch=["author"])
+    assert page[1].related("author").key == "a1"
+    assert Book.objects.filter(title="book 2").prefetch("author").first().related(
+        "author").name == "author 2"
+    assert Book.get("b1").related("author").name == "author 1"
+
+    async def read_async():
+        return [book async for book in Book.aiter_query(
+            {"title?pfx": "book"}, page_size=4, prefetch=["author"])]
+
+    gets = Author.single_flight_stats().calls
+    books = asyncio.run(read_async())
+    # one get per distinct author of each page of 4
+    assert Author.single_flight_stats().calls - gets == 3 + 3 + 1
+    assert [b.related("author").name for b in books[7:]] == ["author 1", "author 2"]
+    with pytest.raises(ValueError):
+        Book.get_all(prefetch=["title"])
+    with pytest.raises(ValueError):
+        Book.get_all(fields=["title"], prefetch=["author"])
+
+
+def test_references_to_models_sharing_a_name():
+    def declare(module):
+        return type("Writer", (DetaModel,), {
+            "__annotations__": {"name": str}, "__module__": module,
+            "Config": type("Config", (), {"table_name": "test_writer"})})
+
+    first = declare("tests.shop")
+    assert Ref["Writer"].target() is first
+    second = declare("tests.blog")
+    with pytest.raises(ValueError, match="Several models"):
+        Ref["Writer"].target()
+    assert Ref["tests.blog.Writer"].target() is second
+    # declaring a model again replaces it
+    again = declare("tests.shop")
+    assert again is not first and Ref["tests.shop.Writer"].target() is again
+
+
+def test_references_survive_response_models():
+    from fastapi import APIRouter
+
+    # FastAPI copies the response model of a route into a subclass of the same name
+    APIRouter().get("/authors/{key}", response_model=Author)(lambda key: None)
+    assert Ref["Author"].target() is Author
+    Author(key="a1", name="Le Guin").save()
+    Book(key="b1", title="Earthsea", author="a1").save()
+    assert Book.get_all(prefetch=["author"])[0].related("author").name == "Le Guin"
+
+
+def test_field_codecs_compress_large_values():
+    class Revision(BaseModel):
+        author: str
+        edited: datetime.date
+
+    class Page(DetaModel):
+        title: str
+        body: str
+        meta: dict = {}
+        revisions: List[Revision] = []
+        dims: List[Dim] = []
+
+        class Config:
+            table_name = "test_page"
+            backend = "local"
+            codecs = {"body": "zlib", "meta": "json", "revisions": "json", "dims": "json"}
+            compress_min_size = 100
+
+    Page.reset_clients()
+    long_body = "<p>lorem ipsum dolor sit amet</p>" * 50
+    Page.put_many([Page(key="short", title="a", body="tiny"),
+                   Page(key="long", title="b", body=long_body, meta={"n": 1})])
+    stored = Page.__db__.get("long")
+    assert stored["body"]["codec"] == "zlib" and len(stored["body"]["data"]) < 200
+    assert Page.__db__.get("short")["body"] == "tiny"
+    assert Page.get("long").body == long_body and Page.get("long").meta == {"n": 1}
+    assert Page.get_all(fields=["body"], output="tuple") == [(long_body,), ("tiny",)]
+    revised = Page(key="revised", title="c", body="", dims=[Dim(w=1, label="x")],
+                   revisions=[Revision(author="ana", edited=datetime.date(2024, 5, 1))])
+    for field in ("revisions", "dims"):
+        assert revised._serialize()[field] == ujson.loads(revised.json(include={field}))[field]
+    revised.save()
+    assert Page.get("revised") == revised
+    # plain dicts assigned to a nested-model field are stored as they are
+    revised.update({"dims": [{"w": 2, "label": "y"}]})
+    assert Page.get("revised").dims == [Dim(w=2, label="y")]
+    revised.dims = [Dim(w=3, label="z"), {"w": 4, "label": "d"}]
+    revised.save()
+    assert Page.get("revised").dims == [Dim(w=3, label="z"), Dim(w=4, label="d")]
+    with pytest.raises(ValueError):
+        type("Broken", (DetaModel,), {
+            "__annotations__": {"body": str},
+            "Config": type("Config", (), {"codecs": {"body": "lz4"}})})
+
+
+def sharded_model(shards, previous_shards=None):
+    class Config:
+        table_name = "test_shard"
+        backend = "local"
+
+    Config.shards, Config.previous_shards = shards, previous_shards
+    return type("Shard", (DetaModel,), {
+        "__annotations__": {"n": int}, "__module__": __name__, "Config": Config})
+
+
+def test_sharding_routes_keys_and_merges_queries():
+    Shard = sharded_model(3)
+    Shard.put_many([Shard(key=f"{i:03d}", n=i) for i in range(60)])
+    new = Shard(n=100)
+    new.save()
+    assert len(new.key) == 12 and Shard.get(new.key).n == 100
+    bases = {name: LocalDeta().Base(name) for name in Shard.__db__.names}
+    sizes = [len(base.fetch(limit=1000).items) for base in bases.values()]
+    assert sum(sizes) == 61 and all(sizes)
+    assert bases[Shard.__db__.home("007")].get("007")["n"] == 7
+
+    keys = sorted([f"{i:03d}" for i in range(60)] + [new.key])
+    assert [i.key for i in Shard.get_all(page_size=7)] == keys
+    assert [i.n for i in Shard.query({"n?lt": 5})] == [0, 1, 2, 3, 4]
+    assert len(Shard.get_all(limit=10)) == 10 and Shard.objects.filter(n__gte=50).count() == 11
+    paged, last = [], None
+    while True:
+        page, last = Shard.get_page({"n?gte": 20}, limit=6, last=last)
+        paged += [i.n for i in page]
+        if not last:
+            break
+    assert paged == list(range(20, 60)) + [100]
+    Shard.delete_key("007")
+    assert Shard.objects.filter(n=7).first() is None
+
+
+def test_online_reshard():
+    Old = sharded_model(1)
+    Old.put_many([Old(key=f"{i:03d}", n=i) for i in range(40)])
+    Moving = sharded_model(4, previous_shards=1)
+    # reads fall back to the old layout, writes move the record
+    assert Moving.get("003").n == 3
+    Moving.get("004").increment("n", 100)
+    Moving.get("005").save()
+    assert [i.n for i in Moving.get_all()][3:6] == [3, 104, 5]
+    assert LocalDeta().Base("test_shard").get("004") is None
+
+    assert Moving.reshard(concurrency=4) == 38
+    assert LocalDeta().Base("test_shard").fetch().items == []
+    Done = sharded_model(4)
+    assert [i.n for i in Done.get_all()] == [0, 1, 2, 3, 104] + list(range(5, 40))
+
+
+def test_index_maintenance():
+    for i in range(6):
+        Tagged(key=f"t{i}", name=f"tagged {i}", tag="even" if i % 2 == 0 else "odd").save()
+    assert [t.key for t in Tagged.query({"tag": "even"})] == ["t0", "t2", "t4"]
+
+    Tagged.get("t0").update({"tag": "odd"})
+    Tagged.delete_key("t2")
+    assert [t.key for t in Tagged.query({"tag": "even"})] == ["t4"]
+    assert [t.key for t in Tagged.query({"tag": "odd", "name": "tagged 0"})] == ["t0"]
+
+    # entries lost from the index Base come back with a rebuild
+    Tagged.__index_db__.delete("tag:" + Tagged._index_digest("odd") + ":t1")
+    assert [t.key for t in Tagged.query({"tag": "odd"})] == ["t0", "t3", "t5"]
+    assert Tagged.rebuild_indexes() == 5
+    assert [t.key for t in Tagged.query({"tag": "odd"})] == ["t0", "t1", "t3", "t5"]
+
+
+def test_partial_update_and_counters():
+    item = make_items(1)[0]
+    item.save()
+    stale = Item.get(item.key)
+
+    item.price = 42
+    item.update({"name": "renamed"})
+    # a concurrent partial update of another field survives
+    stale.update({"opens": datetime.time(7, 0)})
+    stored = Item.get(item.key)
+    assert (stored.name, stored.price, stored.opens) == ("renamed", 42, datetime.time(7, 0))
+
+    stored.increment("price", 3)
+    Item.get(item.key).increment("price")
+    assert stored.price == 45
+    assert Item.get(item.key).price == 46
+
+
+def test_append_to_list_field():
+    item = Tagged(key="list", name="a", tag="x")
+    with pytest.raises(DetaError):
+        item.append("labels", "new")
+    item.save()
+    item.append("labels", "one")
+    Tagged.get("list").append("labels", ["two", "three"])
+    assert item.labels == ["one"]
+    assert Tagged.get("list").labels == ["one", "two", "three"]
+
+
+def test_update_sends_changes_made_in_place():
+    Tagged(key="t", name="a", tag="x", labels=["a", "b"]).save()
+    item = Tagged.get("t")
+    item.labels.append("c")
+    item.update({"labels": item.labels})
+    assert Tagged.get("t").labels == ["a", "b", "c"]
+    item.labels.append("d")
+    item.update()
+    assert Tagged.get("t").labels == ["a", "b", "c", "d"]
+
+    # unchanged lists are not sent over a concurrent append
+    Tagged.get("t").append("labels", "e")
+    item.update({"name": "renamed"})
+    assert Tagged.get("t").labels == ["a", "b", "c", "d", "e"]
+
+    Box(key="b", name="box", dim=Dim(w=1, label="a"), parts=[Dim(w=2, label="b")]).save()
+    for read in (
+        lambda: Box.get("b"),
+        lambda: Box.get("b", trusted=True),
+        lambda: Box.get_all(fields=["dim"])[0],
+    ):
+        box = read()
+        box.dim.w += 1
+        box.update()
+    box = Box.get("b")
+    box.parts[0].label = "changed"
+    box.update()
+    stored = Box.get("b")
+    assert (stored.name, stored.dim.w, stored.parts[0].label) == ("box", 4, "changed")
+
+
+def test_projections():
+    Item.put_many(make_items(3))
+    assert Item.get_all(fields=["name"], output="tuple") == [
+        ("item 0",), ("item 1",), ("item 2",)]
+    assert Item.query({"price?gte": 2}, fields=["released"], output="dict") == [
+        {"key": "0002", "released": datetime.date(2023, 1, 3)}]
+
+    partial = Item.get_page(limit=1, fields=["name", "price"])[0][0]
+    assert (partial.key, partial.name, partial.price, partial.opens) == (
+        "0000", "item 0", 0, None)
+    with pytest.raises(DetaError):
+        partial.save()
+    partial.update({"price": 5})
+    assert Item.get("0000").price == 5
+    assert Item.get("0000").opens == datetime.time(9, 30, 0, 15)
+
+
+def test_trusted_reads_skip_validation():
+    item = make_items(1)[0]
+    item.save()
+    assert Item.get(item.key, trusted=True) == Item.get(item.key)
+
+    Item.__db__.update({"price": "not a number"}, item.key)
+    Item.clear_cache()
+    with pytest.raises(ItemNotFound):
+        Item.get(item.key)
+    assert Item.get(item.key, trusted=True).price == "not a number"
+    assert Item.get_all(trusted=True)[0].price == "not a number"
+
+
+def test_trusted_reads_build_nested_models():
+    Box(key="b", name="box", dim=Dim(w=1, label="x"), parts=[Dim(w=2, label="y")],
+        by_side={"top": Dim(w=3, label="t")}).save()
+    box = Box.get("b", trusted=True)
+    assert box == Box.get("b") and box.dim.w == 1 and box.lid is None
+    assert box.parts[0].label == "y" and box.by_side["top"].w == 3
+    box.dim.w = 10
+    box.lid = Dim(w=4, label="l")
+    box.save()
+    assert Box.get("b", trusted=True) == Box(
+        key="b", name="box", dim=Dim(w=10, label="x"), parts=[Dim(w=2, label="y")],
+        by_side={"top": Dim(w=3, label="t")}, lid=Dim(w=4, label="l"))
+    assert Box.get_all(fields=["parts"])[0].parts == [Dim(w=2, label="y")]
+
+
+def test_record_sets():
+    Item.put_many(make_items(4))
+    rows = Item.get_all(output="record")
+    assert len(rows) == 4 and not hasattr(rows[0], "__dict__")
+    assert rows.column("name") == ["item 0", "item 1", "item 2", "item 3"]
+    assert [row.key for row in rows.sort_by("price", reverse=True)[:2]] == ["0003", "0002"]
+    assert rows[1].to_model() == Item.get("0001")
+    with pytest.raises(AttributeError):
+        rows[0].price = 1
+
+    partial = Item.query({"price": 2}, fields=["name"], output="record")[0]
+    assert (partial.key, partial.name, partial.price) == ("0002", "item 2", None)
+
+
+def test_to_columns_types_and_aggregates():
+    np = pytest.importorskip("numpy")
+    Item.put_many(make_items(6))
+    columns = Item.to_columns(
+        {"price?gte": 1}, fields=["price", "released", "opens", "name"])
+    assert columns.count() == 5
+    assert columns["price"].dtype == np.float64
+    assert columns["released"][0] == np.datetime64("2023-01-02")
+    assert columns["opens"][1] == np.timedelta64(
+        datetime.timedelta(hours=9, minutes=30, seconds=2, microseconds=15))
+    assert columns["name"].dtype == object
+
+    assert columns.sum("price") == 15
+    assert columns.mean("price") == 3
+    even = {name: name.endswith(("0", "2", "4")) for name in columns["name"]}
+    columns["even"] = np.array([even[n] for n in columns["name"]])
+    assert columns.group_by("even", "price", "sum") == {False: 9, True: 6}
+    assert columns.group_by("even") == {False: 3, True: 2}
+    assert columns.group_by("even", "price", "mean") == {False: 3, True: 3}
+
+
+def test_write_behind_coalesces_and_flushes():
+    event = Event(name="first")
+    event.save()
+    event.name = "second"
+    event.save()
+    others = [Event(name=f"event {i}") for i in range(30)]
+    for other in others:
+        other.save()
+    assert Event.get(event.key).name == "second"
+    # a full batch starts a background flush, flush_writes sends the rest
+    for _ in range(100):
+        if Event.write_behind_stats().batches:
+            break
+        time.sleep(0.01)
+    Event.flush_writes()
+    stats = Event.write_behind_stats()
+    assert (stats.enqueued, stats.coalesced, stats.flushed) == (32, 1, 31)
+    assert len(Event.get_all()) == 31
+
+    Event.delete_key(others[0].key)
+    assert len(Event.get_all()) == 30
+
+
+def test_delete_many_and_delete_where():
+    Item.put_many(make_items(10))
+    assert Item.delete_many(["0000", "0001", "0001"]) == 2
+
+    pages = []
+    assert Item.delete_where({"price?lt": 6}, dry_run=True) == 4
+    assert Item.delete_where({"price?lt": 6}, page_size=3,
+                             progress=lambda *counts: pages.append(counts)) == 4
+    assert pages == [(3, 3), (4, 4)]
+    assert [item.key for item in Item.get_all()] == ["0006", "0007", "0008", "0009"]